@@ -7,9 +7,9 @@ if os.environ.get("VERCEL") == "1":
     os.environ["MPLCONFIGDIR"] = "/tmp/matplotlib"
 
 # Dodanie katalogu nadrzędnego do ścieżki, aby zaimportować backend
+# Moduł wykonuje się raz na proces (sys.modules), więc nie sprawdzamy duplikatów w sys.path
 BASE_DIR = Path(__file__).resolve().parent.parent
-if str(BASE_DIR) not in sys.path:
-    sys.path.insert(0, str(BASE_DIR))
+sys.path[:0] = [str(BASE_DIR)]
 
 try:
     # Importujemy aplikację Flask z pliku backend.py
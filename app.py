@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import logging
 import os
+import uuid
+from dataclasses import dataclass, fields
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
-from uuid import uuid4
+from urllib.parse import quote
 
 # Configure matplotlib for Vercel (must be before importing matplotlib)
 IS_VERCEL = os.environ.get("VERCEL") == "1"
@@ -11,10 +17,12 @@ if IS_VERCEL:
     # Set matplotlib config directory to /tmp on Vercel
     os.environ["MPLCONFIGDIR"] = "/tmp/matplotlib"
 
-from flask import Flask, jsonify, render_template, request, send_from_directory, url_for
+from flask import Flask, abort, jsonify, make_response, render_template, request, send_from_directory, url_for
+from werkzeug.security import safe_join
 
-from geocoder import Geocoder
-from label_overrides import load_overrides, update_override, reset_override, set_override
+from json_provider import OrjsonProvider
+from label_overrides import load_overrides, update_override, reset_override, set_overrides
+from paper_formats import PAPER_FORMATS, POSTCARD, WEB_PAPER_FORMATS
 
 BASE_DIR = Path(__file__).parent.resolve()
 STATIC_DIR = BASE_DIR / "static"
@@ -32,10 +40,20 @@ try:
     MAP_STORAGE_DIR.mkdir(parents=True, exist_ok=True)
 except (OSError, PermissionError) as e:
     # Log but don't fail - Vercel will create /tmp if needed
-    import logging
     logging.warning(f"Could not create MAP_STORAGE_DIR {MAP_STORAGE_DIR}: {e}")
 
+# Za nginx-em ustaw np. MAPS_ACCEL_REDIRECT_PREFIX=/_maps/ (location `internal` z aliasem na
+# MAP_STORAGE_DIR) - wtedy bajty PNG wysyła serwer proxy, a Flask zwraca tylko nagłówek.
+MAPS_ACCEL_REDIRECT_PREFIX = os.environ.get("MAPS_ACCEL_REDIRECT_PREFIX")
+# Nazwa pliku mapy to skrót jej treści, więc przeglądarka i CDN mogą ją trzymać długo
+MAPS_MAX_AGE = 365 * 24 * 3600
+
+# Podgląd służy tylko do edycji etykiet w przeglądarce (nakładka skaluje się do figure.width_px),
+# więc renderujemy go w niższej rozdzielczości; pełne DPI dostaje tylko wersja finalna.
+PREVIEW_MAX_DPI = 120
+
 app = Flask(__name__, static_folder=str(STATIC_DIR), template_folder=str(BASE_DIR / "templates"))
+app.json = OrjsonProvider(app)
 
 # Initialize geocoder lazily to avoid issues during module import on Vercel
 _geocoder = None
@@ -43,30 +61,35 @@ _geocoder = None
 def get_geocoder():
     global _geocoder
     if _geocoder is None:
+        # geopy ładuje się ~100 ms - importujemy go dopiero przy pierwszym geokodowaniu
+        from geocoder import Geocoder
         _geocoder = Geocoder()
     return _geocoder
 
 
+# Przecinki i znaki CR traktujemy jak nowe linie - jedno przejście translate zamiast kilku replace
+_CITY_SEPARATORS = str.maketrans({",": "\n", "\r": "\n"})
+
+
 def _normalize_cities(cities_raw: Any) -> List[str]:
     if isinstance(cities_raw, list):
         values = cities_raw
     elif isinstance(cities_raw, str):
-        separators = [",", "\n", "\r"]
-        for sep in separators:
-            cities_raw = cities_raw.replace(sep, "\n")
-        values = cities_raw.split("\n")
+        values = cities_raw.translate(_CITY_SEPARATORS).split("\n")
     else:
         values = []
 
-    normalized = [value.strip() for value in values if value and value.strip()]
-    return normalized
+    return [name for name in (value.strip() for value in values if value) if name]
+
+
+_BOOL_TRUE = frozenset({"1", "true", "t", "yes", "y", "tak"})
 
 
 def _parse_bool(value: Any) -> bool:
     if isinstance(value, bool):
         return value
     if isinstance(value, str):
-        return value.lower() in {"1", "true", "t", "yes", "y", "tak"}
+        return value.lower() in _BOOL_TRUE
     if isinstance(value, (int, float)):
         return value != 0
     return False
@@ -77,8 +100,7 @@ def _build_route(cities: List[str]) -> tuple[List[Dict[str, Any]], List[str]]:
     warnings: List[str] = []
     geocoder = get_geocoder()
 
-    for city in cities:
-        coords = geocoder.get_coordinates(city)
+    for city, coords in zip(cities, geocoder.get_coordinates_batch(cities)):
         if coords:
             lat, lon = coords
             route.append({
@@ -91,32 +113,49 @@ def _build_route(cities: List[str]) -> tuple[List[Dict[str, Any]], List[str]]:
     return route, warnings
 
 
+def _json_body() -> Dict[str, Any]:
+    # Ciało jest dekodowane raz (orjson przez app.json) i zapamiętywane przez Flask na obiekcie
+    # request; błędny JSON lub inny typ niż obiekt traktujemy jak pusty payload.
+    data = request.get_json(force=True, silent=True)
+    return data if isinstance(data, dict) else {}
+
+
 @app.route("/")
-def index() -> str:
-    # Lazy import to avoid matplotlib initialization issues on Vercel
-    from map_generator import PosterMapGenerator, LandscapePosterMapGenerator, LargePosterMapGenerator, LandscapeLargePosterMapGenerator
-    
-    paper_formats = [
-        {"id": "", "label": "Automatycznie"},
-        {"id": "POSTCARD", "label": "Pocztówka 10 × 15 cm (4 × 6 cali)"},
-        {"id": PosterMapGenerator.FORMAT_ID, "label": "Plakat 50 × 70 cm (pionowy)"},
-        {"id": LandscapePosterMapGenerator.FORMAT_ID, "label": "Plakat 70 × 50 cm (poziomy)"},
-        {"id": LargePosterMapGenerator.FORMAT_ID, "label": "Plakat 60 × 100 cm (pionowy)"},
-        {"id": LandscapeLargePosterMapGenerator.FORMAT_ID, "label": "Plakat 100 × 60 cm (poziomy)"},
-    ]
+def index() -> Any:
+    # The page is static per deploy - render it once and let the CDN keep it for a while.
+    # In debug mode skip the cache so template edits show up on reload.
+    html = _render_index.__wrapped__() if app.debug else _render_index()
+    response = make_response(html)
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return response
+
+
+@lru_cache(maxsize=1)
+def _render_index() -> str:
+    # Tabela formatów z paper_formats - wspólna z map_generator, ale bez importu matplotlib,
+    # więc GET / nie płaci za niego przy zimnym starcie
+    paper_formats = [{"id": format_id, "label": label} for format_id, label in WEB_PAPER_FORMATS]
     return render_template("index.html", paper_formats=paper_formats)
 
 
 @app.route("/maps/<path:filename>")
 def serve_map(filename: str):
     """Serwuje wygenerowane mapy zarówno lokalnie, jak i na Vercel."""
-    return send_from_directory(str(MAP_STORAGE_DIR), filename, mimetype="image/png")
+    if MAPS_ACCEL_REDIRECT_PREFIX:
+        if safe_join(str(MAP_STORAGE_DIR), filename) is None:
+            abort(404)
+        response = make_response("")
+        response.headers["X-Accel-Redirect"] = f"{MAPS_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{quote(filename)}"
+        response.headers["Content-Type"] = "image/png"
+        response.headers["Cache-Control"] = f"public, max-age={MAPS_MAX_AGE}"
+        return response
+    return send_from_directory(str(MAP_STORAGE_DIR), filename, mimetype="image/png", max_age=MAPS_MAX_AGE)
 
 
 @app.post("/api/generate")
 def generate_map() -> Any:
     if request.is_json:
-        payload: Dict[str, Any] = request.get_json(force=True) or {}
+        payload = _json_body()
     else:
         payload = request.form.to_dict(flat=True)
 
@@ -125,13 +164,12 @@ def generate_map() -> Any:
         message, status = error_response
         return jsonify({"success": False, "error": message}), status
 
-    preview_filename = f"map_preview_{uuid4().hex}.png"
     map_info = _create_map(
         route,
-        options,
+        _preview_options(options),
         overrides=load_overrides(),
         render_labels=False,
-        output_filename=preview_filename,
+        output_prefix="map_preview",
     )
 
     response = {
@@ -150,9 +188,11 @@ def nudge_label() -> Any:
 
 @app.post("/api/labels/apply")
 def apply_labels() -> Any:
-    data = request.get_json(force=True) or {}
+    data = _json_body()
     labels = data.get("labels") or []
-    payload = data.get("payload") or {}
+    payload = data.get("payload")
+    if not isinstance(payload, dict):
+        payload = {}
     hidden_labels_raw = data.get("hidden_labels") or []
     hidden_labels_set = set(hidden_labels_raw) if isinstance(hidden_labels_raw, list) else set()
 
@@ -161,50 +201,27 @@ def apply_labels() -> Any:
         message, status = error_response
         return jsonify({"success": False, "error": message}), status
 
-    overrides = load_overrides()
     try:
-        for entry in labels:
-            city = entry.get("city")
-            if not city:
-                continue
-            # Save offsets relative to anchor
-            dx = float(entry.get("dx", 0.0))
-            dy = float(entry.get("dy", 0.0))
-            overrides = set_override(city, dx, dy)
-
-        if data.get("final"):
-            final_filename = f"map_final_{uuid4().hex}.png"
-            map_info = _create_map(
-                route,
-                options,
-                overrides,
-                render_labels=True,
-                output_filename=final_filename,
-                hidden_labels=hidden_labels_set,
-            )
-        else:
-            preview_filename = f"map_preview_{uuid4().hex}.png"
-            map_info = _create_map(
-                route,
-                options,
-                overrides,
-                render_labels=False,
-                output_filename=preview_filename,
-                hidden_labels=hidden_labels_set,
-            )
-
-            final_filename = f"map_final_{uuid4().hex}.png"
-            final_map_info = _create_map(
-                route,
-                options,
-                overrides,
-                render_labels=True,
-                output_filename=final_filename,
-                hidden_labels=hidden_labels_set,
-            )
-            map_info["finalDownload"] = final_map_info
-            for key in ("figure", "axes", "bounds", "style", "labels", "paper", "paper_format", "paper_label", "paper_orientation"):
-                map_info[key] = final_map_info.get(key, map_info.get(key))
+        # Save offsets relative to anchor - all labels in one transaction, one table read
+        entries = [
+            (entry["city"], float(entry.get("dx", 0.0)), float(entry.get("dy", 0.0)))
+            for entry in labels
+            if entry.get("city")
+        ]
+        overrides = set_overrides(entries) if entries else load_overrides()
+
+        # Preview and final share the same geometry; the preview only leaves labels
+        # to the browser overlay, so a single render per request is enough.
+        final = bool(data.get("final"))
+        prefix = "map_final" if final else "map_preview"
+        map_info = _create_map(
+            route,
+            options if final else _preview_options(options),
+            overrides,
+            render_labels=final,
+            output_prefix=prefix,
+            hidden_labels=hidden_labels_set,
+        )
     except Exception as exc:  # pragma: no cover
         app.logger.exception("Label apply failed")
         return jsonify({
@@ -221,116 +238,142 @@ def apply_labels() -> Any:
     return jsonify(response), 200
 
 
-def _prepare_generation(payload: Dict[str, Any]) -> tuple[List[Dict[str, Any]], List[str], Dict[str, Any], Optional[tuple[str, int]]]:
-    cities = _normalize_cities(payload.get("cities", []))
-    if not cities:
-        return [], [], {}, ("Podaj co najmniej jedno miasto.", 400)
-
-    background = payload.get("background") or None
-    font_family = payload.get("font_family") or payload.get("font") or None
-    font_color = payload.get("font_color") or None
-    paper_format = payload.get("paper_format") or payload.get("paper") or None
-    if isinstance(paper_format, str) and paper_format.strip():
-        paper_format = paper_format.strip().upper()
-    else:
-        paper_format = None
+class PayloadError(ValueError):
+    """Niepoprawne pole w danych żądania; komunikat trafia do odpowiedzi 400."""
 
-    dpi_raw = payload.get("dpi")
-    dpi_value: Optional[int] = None
-    if dpi_raw not in (None, ""):
-        try:
-            dpi_value = int(dpi_raw)
-        except (TypeError, ValueError):
-            return [], [], {}, ("DPI musi być liczbą całkowitą.", 400)
 
-    show_borders = _parse_bool(payload.get("show_borders") or payload.get("borders"))
-    line_style = payload.get("line_style") or payload.get("lineStyle") or "dashed"
-    line_color = payload.get("line_color") or payload.get("lineColor") or "#f2f4ff"
-    point_style = payload.get("point_style") or payload.get("pointStyle") or "circle"
-    point_color = payload.get("point_color") or payload.get("pointColor") or "#f2f4ff"
+def _first(payload: Dict[str, Any], *keys: str) -> Any:
+    # Pierwsza niepusta wartość spośród aliasów pola (np. line_style / lineStyle)
+    for key in keys:
+        value = payload.get(key)
+        if value:
+            return value
+    return None
 
-    line_width_raw = payload.get("line_width") or payload.get("lineWidth")
-    line_width: Optional[float] = None
-    if line_width_raw not in (None, ""):
-        try:
-            line_width = float(line_width_raw)
-        except (TypeError, ValueError):
-            return [], [], {}, ("Szerokość linii musi być liczbą.", 400)
 
-    point_size_raw = payload.get("point_size") or payload.get("pointSize")
+def _optional_number(raw: Any, cast: Any, message: str) -> Any:
+    if raw in (None, ""):
+        return None
+    try:
+        return cast(raw)
+    except (TypeError, ValueError):
+        raise PayloadError(message) from None
+
+
+_SIGNATURE_POSITIONS = frozenset({"bottom_right", "bottom_left", "top_right", "top_left", "bottom_center", "top_center"})
+
+
+@dataclass(frozen=True)
+class GenerationOptions:
+    """Opcje generowania mapy, walidowane jednorazowo z danych żądania."""
+
+    cities: List[str]
+    background_color: str = "#0a3dbb"
+    font_family: str = "Helvetica"
+    font_color: str = "#ffffff"
+    show_borders: bool = False
+    paper_format: Optional[str] = None
+    dpi: int = 300
+    line_style: str = "dashed"
+    line_color: str = "#f2f4ff"
+    line_width: Optional[float] = None
+    point_style: str = "circle"
+    point_color: str = "#f2f4ff"
     point_size: Optional[float] = None
-    if point_size_raw not in (None, ""):
-        try:
-            point_size = float(point_size_raw)
-        except (TypeError, ValueError):
-            return [], [], {}, ("Rozmiar punktów musi być liczbą.", 400)
-
-    title_text = payload.get("title") or payload.get("title_text")
-    footer_left_text = payload.get("footer_left") or payload.get("footerLeft")
-    footer_right_text = payload.get("footer_right") or payload.get("footerRight")
-    footer_font_size_raw = payload.get("footer_font_size")
+    title_text: Optional[str] = None
+    footer_left_text: Optional[str] = None
+    footer_right_text: Optional[str] = None
     footer_font_size: Optional[float] = None
-    if footer_font_size_raw not in (None, "", "auto"):
-        try:
-            footer_font_size_value = float(footer_font_size_raw)
-            # Tylko ustaw wartość, jeśli jest większa od 0
-            if footer_font_size_value > 0:
-                footer_font_size = footer_font_size_value
-        except (TypeError, ValueError):
-            return [], [], {}, ("Rozmiar czcionki stopek musi być liczbą.", 400)
-    text_font = payload.get("text_font") or payload.get("textFont")
-
-    signature_enabled = _parse_bool(payload.get("signature_enabled"))
-    signature_path = payload.get("signature_path") or None
-    if signature_enabled and not signature_path:
-        signature_path = "static/signature/signature.png"
-    signature_position_raw = payload.get("signature_position") or "bottom_right"
-    signature_position = str(signature_position_raw).strip().lower() if signature_position_raw else "bottom_right"
-    allowed_positions = {"bottom_right", "bottom_left", "top_right", "top_left", "bottom_center", "top_center"}
-    if signature_position not in allowed_positions:
-        signature_position = "bottom_right"
-    signature_scale_raw = payload.get("signature_scale")
+    text_font_family: Optional[str] = None
+    signature_enabled: bool = False
+    signature_path: Optional[str] = None
+    signature_position: str = "bottom_right"
     signature_scale: Optional[float] = None
-    if signature_scale_raw not in (None, ""):
-        try:
-            signature_scale_value = float(signature_scale_raw)
-        except (TypeError, ValueError):
-            return [], [], {}, ("Skala podpisu musi być liczbą.", 400)
-        signature_scale_value = max(2.0, min(signature_scale_value, 50.0))
-        signature_scale = signature_scale_value / 100.0
+    merge_bidirectional_routes: bool = False
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> "GenerationOptions":
+        cities = _normalize_cities(payload.get("cities", []))
+        if not cities:
+            raise PayloadError("Podaj co najmniej jedno miasto.")
+
+        paper_format = _first(payload, "paper_format", "paper")
+        if isinstance(paper_format, str) and paper_format.strip():
+            paper_format = paper_format.strip().upper()
+        else:
+            paper_format = None
+
+        dpi = _optional_number(payload.get("dpi"), int, "DPI musi być liczbą całkowitą.")
+        line_width = _optional_number(_first(payload, "line_width", "lineWidth"), float, "Szerokość linii musi być liczbą.")
+        point_size = _optional_number(_first(payload, "point_size", "pointSize"), float, "Rozmiar punktów musi być liczbą.")
+
+        footer_font_size = _optional_number(
+            payload.get("footer_font_size") if payload.get("footer_font_size") != "auto" else None,
+            float,
+            "Rozmiar czcionki stopek musi być liczbą.",
+        )
+        # Tylko ustaw wartość, jeśli jest większa od 0
+        if footer_font_size is not None and footer_font_size <= 0:
+            footer_font_size = None
+
+        signature_enabled = _parse_bool(payload.get("signature_enabled"))
+        signature_path = payload.get("signature_path") or None
+        if signature_enabled and not signature_path:
+            signature_path = "static/signature/signature.png"
+        signature_position_raw = payload.get("signature_position")
+        signature_position = str(signature_position_raw).strip().lower() if signature_position_raw else "bottom_right"
+        if signature_position not in _SIGNATURE_POSITIONS:
+            signature_position = "bottom_right"
+        signature_scale = _optional_number(payload.get("signature_scale"), float, "Skala podpisu musi być liczbą.")
+        if signature_scale is not None:
+            signature_scale = max(2.0, min(signature_scale, 50.0)) / 100.0
+
+        return cls(
+            cities=cities,
+            background_color=payload.get("background") or "#0a3dbb",
+            font_family=_first(payload, "font_family", "font") or "Helvetica",
+            font_color=payload.get("font_color") or "#ffffff",
+            show_borders=_parse_bool(_first(payload, "show_borders", "borders")),
+            paper_format=paper_format,
+            dpi=dpi or 300,
+            line_style=_first(payload, "line_style", "lineStyle") or "dashed",
+            line_color=_first(payload, "line_color", "lineColor") or "#f2f4ff",
+            line_width=line_width,
+            point_style=_first(payload, "point_style", "pointStyle") or "circle",
+            point_color=_first(payload, "point_color", "pointColor") or "#f2f4ff",
+            point_size=point_size,
+            title_text=_first(payload, "title", "title_text"),
+            footer_left_text=_first(payload, "footer_left", "footerLeft"),
+            footer_right_text=_first(payload, "footer_right", "footerRight"),
+            footer_font_size=footer_font_size,
+            text_font_family=_first(payload, "text_font", "textFont"),
+            signature_enabled=signature_enabled,
+            signature_path=signature_path,
+            signature_position=signature_position,
+            signature_scale=signature_scale,
+            merge_bidirectional_routes=_parse_bool(payload.get("merge_bidirectional_routes")),
+        )
+
+    def to_options(self) -> Dict[str, Any]:
+        # Słownik opcji przekazywany do _create_map (bez listy miast)
+        return {field.name: getattr(self, field.name) for field in fields(self) if field.name != "cities"}
 
-    merge_bidirectional_routes = _parse_bool(payload.get("merge_bidirectional_routes"))
 
-    route, warnings = _build_route(cities)
+def _prepare_generation(payload: Dict[str, Any]) -> tuple[List[Dict[str, Any]], List[str], Dict[str, Any], Optional[tuple[str, int]]]:
+    try:
+        parsed = GenerationOptions.from_payload(payload)
+    except PayloadError as exc:
+        return [], [], {}, (str(exc), 400)
+
+    route, warnings = _build_route(parsed.cities)
     if not route:
         return [], [], {}, ("Brak miast z poprawnymi współrzędnymi.", 400)
 
-    options = {
-        "background_color": background or "#0a3dbb",
-        "font_family": font_family or "Helvetica",
-        "font_color": font_color or "#ffffff",
-        "show_borders": show_borders,
-        "paper_format": paper_format,
-        "dpi": dpi_value or 300,
-        "line_style": line_style,
-        "line_color": line_color,
-        "line_width": line_width,
-        "point_style": point_style,
-        "point_color": point_color,
-        "point_size": point_size,
-        "title_text": title_text,
-        "footer_left_text": footer_left_text,
-        "footer_right_text": footer_right_text,
-        "footer_font_size": footer_font_size,
-        "text_font_family": text_font,
-        "signature_enabled": signature_enabled,
-        "signature_path": signature_path,
-        "signature_position": signature_position,
-        "signature_scale": signature_scale,
-        "merge_bidirectional_routes": merge_bidirectional_routes,
-    }
+    return route, warnings, parsed.to_options(), None
 
-    return route, warnings, options, None
+
+def _preview_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    return options | {"dpi": min(options["dpi"], PREVIEW_MAX_DPI)}
 
 
 def _create_map(
@@ -338,12 +381,9 @@ def _create_map(
     options: Dict[str, Any],
     overrides: Optional[Dict[str, Dict[str, float]]] = None,
     render_labels: bool = False,
-    output_filename: Optional[str] = None,
+    output_prefix: str = "map",
     hidden_labels: Optional[set] = None,
 ) -> Dict[str, Any]:
-    filename = output_filename or f"map_{uuid4().hex}.png"
-    output_path = MAP_STORAGE_DIR / filename
-
     paper_format_raw = options.get("paper_format")
     paper_format = paper_format_raw.strip().upper() if isinstance(paper_format_raw, str) else None
     generator_kwargs = dict(options)
@@ -358,33 +398,39 @@ def _create_map(
         generator_kwargs["signature_scale"] = None
     overrides_payload = overrides or {}
     dpi_value = int(options.get("dpi") or 300)
+    hidden_labels_set = hidden_labels or set()
+
+    # Ta sama trasa, opcje i etykiety dają ten sam plik - przy trafieniu pomijamy render
+    cache_key = _map_cache_key(route, generator_kwargs, overrides_payload, render_labels, hidden_labels_set)
+    filename = f"{output_prefix}_{cache_key}.png"
+    output_path = MAP_STORAGE_DIR / filename
+    meta_path = output_path.with_suffix(".json")
+    if output_path.exists() and meta_path.exists():
+        try:
+            map_info = json.loads(meta_path.read_text(encoding="utf-8"))
+            map_info["mapUrl"] = url_for("serve_map", filename=filename)
+            return map_info
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read cached map metadata {meta_path}: {e}")
 
     # Lazy import to avoid matplotlib initialization issues on Vercel
-    from map_generator import MapGenerator, PosterMapGenerator, LandscapePosterMapGenerator, LargePosterMapGenerator, LandscapeLargePosterMapGenerator
-
-    if paper_format == PosterMapGenerator.FORMAT_ID:
-        generator = PosterMapGenerator(**generator_kwargs)
-        paper_meta = PosterMapGenerator.paper_metadata(dpi_value)
-    elif paper_format == LandscapePosterMapGenerator.FORMAT_ID:
-        generator = LandscapePosterMapGenerator(**generator_kwargs)
-        paper_meta = LandscapePosterMapGenerator.paper_metadata(dpi_value)
-    elif paper_format == LargePosterMapGenerator.FORMAT_ID:
-        generator = LargePosterMapGenerator(**generator_kwargs)
-        paper_meta = LargePosterMapGenerator.paper_metadata(dpi_value)
-    elif paper_format == LandscapeLargePosterMapGenerator.FORMAT_ID:
-        generator = LandscapeLargePosterMapGenerator(**generator_kwargs)
-        paper_meta = LandscapeLargePosterMapGenerator.paper_metadata(dpi_value)
-    elif paper_format == "POSTCARD":
+    from map_generator import MapGenerator
+
+    poster_cls = _poster_generators().get(paper_format)
+    if poster_cls is not None:
+        generator = poster_cls(**generator_kwargs)
+        paper_meta = poster_cls.paper_metadata(dpi_value)
+    elif paper_format == POSTCARD:
         # Format pocztówki używa klasy bazowej MapGenerator z paper_format
         generator = MapGenerator(**generator_kwargs)
-        spec = MapGenerator.PAPER_FORMATS.get("POSTCARD", {})
+        spec = PAPER_FORMATS[POSTCARD]
         paper_meta = {
-            "format": "POSTCARD",
-            "label": spec.get("label", "Pocztówka 10 × 15 cm"),
+            "format": POSTCARD,
+            "label": spec.label,
             "orientation": "portrait",
             "dpi": dpi_value,
-            "width_mm": float(spec.get("width_mm", 100.0)),
-            "height_mm": float(spec.get("height_mm", 150.0)),
+            "width_mm": spec.width_mm,
+            "height_mm": spec.height_mm,
         }
     else:
         generator_kwargs["paper_format"] = None
@@ -398,22 +444,82 @@ def _create_map(
             "height_mm": None,
         }
 
-    hidden_labels_set = hidden_labels or set()
-    map_info = generator.generate_map(
-        route,
-        str(output_path),
-        label_overrides=overrides_payload,
-        render_labels=render_labels,
-        hidden_labels=hidden_labels_set,
-    )
+    # Render pod tymczasową nazwą i podmiana - równoległe identyczne żądanie (albo klient,
+    # który już pobiera plik z długim max-age) nigdy nie widzi niedopisanego PNG
+    tmp_output_path = _temp_sibling(output_path)
+    try:
+        map_info = generator.generate_map(
+            route,
+            str(tmp_output_path),
+            label_overrides=overrides_payload,
+            render_labels=render_labels,
+            hidden_labels=hidden_labels_set,
+        )
+        generator.wait_for_saves()
+        os.replace(tmp_output_path, output_path)
+    finally:
+        tmp_output_path.unlink(missing_ok=True)
 
     map_info["paper"] = paper_meta
     map_info["paper_format"] = paper_meta.get("format")
     map_info["paper_label"] = paper_meta.get("label")
     map_info["paper_orientation"] = paper_meta.get("orientation")
+    tmp_meta_path = _temp_sibling(meta_path)
+    try:
+        tmp_meta_path.write_text(json.dumps(map_info), encoding="utf-8")
+        os.replace(tmp_meta_path, meta_path)
+    except (OSError, TypeError, ValueError) as e:
+        logging.warning(f"Could not save map metadata {meta_path}: {e}")
+    finally:
+        tmp_meta_path.unlink(missing_ok=True)
     map_info["mapUrl"] = url_for("serve_map", filename=filename)
     return map_info
 
 
+def _temp_sibling(path: Path) -> Path:
+    # Unikalna nazwa w tym samym katalogu (os.replace w obrębie systemu plików); rozszerzenie
+    # zostaje na końcu, bo po nim savefig wybiera format
+    return path.with_name(f".{path.stem}.{uuid.uuid4().hex}.tmp{path.suffix}")
+
+
+@lru_cache(maxsize=1)
+def _poster_generators() -> Dict[str, Any]:
+    # Rejestr FORMAT_ID -> klasa plakatu, budowany przy pierwszym renderze (import matplotlib)
+    from map_generator import PosterMapGenerator, LandscapePosterMapGenerator, LargePosterMapGenerator, LandscapeLargePosterMapGenerator
+
+    return {
+        cls.FORMAT_ID: cls
+        for cls in (PosterMapGenerator, LandscapePosterMapGenerator, LargePosterMapGenerator, LandscapeLargePosterMapGenerator)
+    }
+
+
+def _map_cache_key(
+    route: List[Dict[str, Any]],
+    generator_kwargs: Dict[str, Any],
+    overrides: Dict[str, Dict[str, float]],
+    render_labels: bool,
+    hidden_labels: set,
+) -> str:
+    names = sorted({item["name"] for item in route})
+    signature_mtime = None
+    signature_path = generator_kwargs.get("signature_path")
+    if generator_kwargs.get("signature_enabled") and signature_path:
+        try:
+            signature_mtime = os.stat(signature_path).st_mtime_ns
+        except OSError:
+            pass
+    key_payload = [
+        route,
+        generator_kwargs,
+        # Tylko przesunięcia miast z tej trasy - zmiany innych etykiet nie unieważniają pliku
+        {name: overrides[name] for name in names if name in overrides},
+        render_labels,
+        sorted(hidden_labels),
+        signature_mtime,
+    ]
+    encoded = json.dumps(key_payload, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
 if __name__ == "__main__":
     app.run(debug=True, host='0.0.0.0', port=5001)
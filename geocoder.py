@@ -1,24 +1,55 @@
 """
 Moduł pobierania współrzędnych geograficznych miast.
 """
+import json
+import logging
+import os
+import threading
 import time
 import unicodedata
-from typing import List, Optional, Tuple
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 import ssl
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 import certifi
+from geopy.adapters import RequestsAdapter
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 
+BASE_DIR = Path(__file__).parent.resolve()
+IS_VERCEL = os.environ.get("VERCEL") == "1"
+TMP_DIR = Path(os.environ.get("TMPDIR") or "/tmp")
+
+# Na Vercel zapisywać można tylko w /tmp; lokalnie cache leży obok kodu
+if IS_VERCEL:
+    CACHE_PATH = TMP_DIR / "geocode_cache.json"
+else:
+    CACHE_PATH = BASE_DIR / "geocode_cache.json"
+# Opcjonalny plik z gotowymi współrzędnymi popularnych miast (tylko do odczytu)
+SEED_PATH = BASE_DIR / "geocode_seed.json"
+
 
 class Geocoder:
     """Pobiera współrzędne geograficzne dla nazw miast używając Nominatim API."""
 
     def __init__(self, user_agent: str = "route_mapper_app"):
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        self.geolocator = Nominatim(user_agent=user_agent, ssl_context=ssl_context)
         self.rate_limit_delay = 1.0  # Opóźnienie między zapytaniami (Nominatim wymaga)
         self.retry_attempts = 3
+        self.max_workers = 4
+        ssl_context = ssl.create_default_context(cafile=certifi.where())
+        # Jedna sesja requests z pulą keep-alive - kolejne miasta nie powtarzają handshake TLS.
+        # Pula mieści po jednym połączeniu na wątek get_coordinates_batch.
+        adapter_factory = partial(RequestsAdapter, pool_connections=1, pool_maxsize=self.max_workers)
+        self.geolocator = Nominatim(user_agent=user_agent, ssl_context=ssl_context, adapter_factory=adapter_factory)
+        # Limit zapytań jest wspólny dla wszystkich wątków get_coordinates_batch
+        self._rate_lock = threading.Lock()
+        self._last_call_ts = 0.0
+        self._cache_lock = threading.Lock()
+        self._cache: Dict[str, Tuple[float, float]] = {}
+        self._dirty = False
+        self._load_cache()
 
     @staticmethod
     def _normalize_key(value: str) -> str:
@@ -26,6 +57,41 @@ class Geocoder:
         value = unicodedata.normalize("NFKD", value.strip().lower())
         return "".join(char for char in value if not unicodedata.combining(char))
 
+    def _load_cache(self) -> None:
+        """Wczytuje współrzędne z pliku seed oraz z cache na dysku."""
+        for path in (SEED_PATH, CACHE_PATH):
+            if not path.exists():
+                continue
+            try:
+                raw = json.loads(path.read_text(encoding="utf-8"))
+            except (json.JSONDecodeError, OSError, ValueError):
+                continue
+            if not isinstance(raw, dict):
+                continue
+            for key, value in raw.items():
+                try:
+                    lat, lon = value
+                    self._cache[self._normalize_key(key)] = (float(lat), float(lon))
+                except (TypeError, ValueError):
+                    continue
+
+    def _save_cache(self) -> None:
+        # Zapis do pliku tymczasowego i podmiana - przerwany zapis (albo drugi proces)
+        # nie zostawi uciętego cache
+        tmp_path = CACHE_PATH.with_name(f"{CACHE_PATH.name}.{os.getpid()}.tmp")
+        try:
+            CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            data = {key: [lat, lon] for key, (lat, lon) in self._cache.items()}
+            tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp_path, CACHE_PATH)
+        except OSError as e:
+            # Tylko do odczytu (np. Vercel poza /tmp) - cache zostaje w pamięci procesu
+            logging.warning(f"Could not save geocode cache to {CACHE_PATH}: {e}")
+            try:
+                tmp_path.unlink(missing_ok=True)
+            except OSError:
+                pass
+
     def _build_query_candidates(self, city_name: str) -> List[str]:
         base = city_name.strip()
         if not base:
@@ -55,10 +121,18 @@ class Geocoder:
 
         return candidates
 
+    def _wait_for_rate_limit(self) -> None:
+        """Czeka tylko tyle, ile brakuje do odstępu od poprzedniego zapytania."""
+        with self._rate_lock:
+            delta = self.rate_limit_delay - (time.monotonic() - self._last_call_ts)
+            if delta > 0:
+                time.sleep(delta)
+            self._last_call_ts = time.monotonic()
+
     def _geocode_query(self, query: str) -> Optional[Tuple[float, float]]:
         for attempt in range(1, self.retry_attempts + 1):
             try:
-                time.sleep(self.rate_limit_delay)
+                self._wait_for_rate_limit()
                 location = self.geolocator.geocode(
                     query,
                     timeout=10,
@@ -88,9 +162,64 @@ class Geocoder:
         Returns:
             Tuple (latitude, longitude) lub None jeśli nie znaleziono
         """
+        coords = self._lookup(city_name)
+        self.flush()
+        return coords
+
+    def _lookup(self, city_name: str) -> Optional[Tuple[float, float]]:
+        """Cache, a przy braku trafienia Nominatim; nowe wyniki trafiają tylko do pamięci."""
+        key = self._normalize_key(city_name)
+        cached = self._cache.get(key)
+        if cached:
+            return cached
+
         for query in self._build_query_candidates(city_name):
             coords = self._geocode_query(query)
             if coords:
+                if key:
+                    with self._cache_lock:
+                        self._cache[key] = coords
+                        self._dirty = True
                 return coords
         print(f"Nie udało się pobrać współrzędnych dla '{city_name}'.")
         return None
+
+    def flush(self) -> None:
+        """Zapisuje cache na dysk, jeśli od ostatniego zapisu pojawiły się nowe współrzędne."""
+        with self._cache_lock:
+            if self._dirty:
+                self._save_cache()
+                self._dirty = False
+
+    def get_coordinates_batch(self, city_names: List[str]) -> List[Optional[Tuple[float, float]]]:
+        """
+        Pobiera współrzędne dla wielu miast, odpytując Nominatim równolegle.
+
+        Miasta obecne w cache nie trafiają do puli wątków, a powtórzone nazwy
+        (np. trasa w obie strony) są pobierane tylko raz. Plik cache jest
+        zapisywany raz, po pobraniu całej partii. Pozostałe są
+        pobierane współbieżnie - odstępy między zapytaniami pilnuje wspólny
+        limit, więc oczekiwanie nakłada się na czas odpowiedzi serwera.
+
+        Returns:
+            Lista współrzędnych (lub None) w kolejności nazw wejściowych
+        """
+        keys = [self._normalize_key(name) for name in city_names]
+        results: List[Optional[Tuple[float, float]]] = [self._cache.get(key) for key in keys]
+        # Jedna nazwa na znormalizowany klucz, w kolejności pierwszego wystąpienia
+        missing: Dict[str, str] = {}
+        for name, key, coords in zip(city_names, keys, results):
+            if coords is None:
+                missing.setdefault(key, name)
+        if not missing:
+            return results
+
+        workers = max(1, min(self.max_workers, len(missing)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            fetched = dict(zip(missing, executor.map(self._lookup, missing.values())))
+        # Jeden zapis pliku cache na całą partię zamiast po każdym mieście
+        self.flush()
+        for idx, key in enumerate(keys):
+            if results[idx] is None:
+                results[idx] = fetched[key]
+        return results
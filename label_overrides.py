@@ -1,25 +1,54 @@
 from __future__ import annotations
 
 import json
+import logging
 import os
+import sqlite3
+import threading
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import orjson  # type: ignore
+    _ORJSON_AVAILABLE = True
+except Exception:
+    _ORJSON_AVAILABLE = False
 
 BASE_DIR = Path(__file__).parent.resolve()
 IS_VERCEL = os.environ.get("VERCEL") == "1"
 TMP_DIR = Path(os.environ.get("TMPDIR") or "/tmp")
 
 # On Vercel, use /tmp for writable storage; otherwise use BASE_DIR
+# Legacy JSON store - imported into the database once, when the database is created.
+# On Vercel it lives in /tmp too, so the repo's local offsets never seed a deployment
 if IS_VERCEL:
+    DB_PATH = TMP_DIR / "label_overrides.sqlite"
     OVERRIDES_PATH = TMP_DIR / "label_overrides.json"
 else:
+    DB_PATH = BASE_DIR / "label_overrides.sqlite"
     OVERRIDES_PATH = BASE_DIR / "label_overrides.json"
 
-def load_overrides() -> Dict[str, Dict[str, float]]:
+_SCHEMA_VERSION = 1
+
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+# Overrides keyed by PRAGMA data_version; own writes reset it, other connections bump the version
+_CACHE: Optional[Tuple[int, Dict[str, Dict[str, float]]]] = None
+
+
+def _copy_overrides(data: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    # Callers mutate the returned dict, so never hand out the cached one
+    return {key: dict(value) for key, value in data.items()}
+
+def _read_legacy_overrides() -> Dict[str, Dict[str, float]]:
     if not OVERRIDES_PATH.exists():
         return {}
     try:
-        raw = json.loads(OVERRIDES_PATH.read_text(encoding="utf-8"))
+        if _ORJSON_AVAILABLE:
+            # orjson parses the raw bytes, skipping the str decode
+            raw = orjson.loads(OVERRIDES_PATH.read_bytes())
+        else:
+            raw = json.loads(OVERRIDES_PATH.read_text(encoding="utf-8"))
         if isinstance(raw, dict):
             cleaned: Dict[str, Dict[str, float]] = {}
             for key, value in raw.items():
@@ -38,37 +67,112 @@ def load_overrides() -> Dict[str, Dict[str, float]]:
     except (json.JSONDecodeError, OSError, ValueError):
         return {}
 
-def save_overrides(data: Dict[str, Dict[str, float]]) -> None:
+def _open_connection() -> sqlite3.Connection:
     try:
         # Ensure parent directory exists (especially for /tmp on Vercel)
-        OVERRIDES_PATH.parent.mkdir(parents=True, exist_ok=True)
-        OVERRIDES_PATH.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-    except (OSError, PermissionError) as e:
-        # On Vercel or read-only filesystem, log but don't fail
+        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(DB_PATH), isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+    except (OSError, sqlite3.Error) as e:
+        # On a read-only filesystem keep overrides in memory only
         # Overrides will be lost between invocations, but that's acceptable
-        import logging
-        logging.warning(f"Could not save label overrides to {OVERRIDES_PATH}: {e}")
+        logging.warning(f"Could not open label overrides database {DB_PATH}: {e}")
+        conn = sqlite3.connect(":memory:", isolation_level=None, check_same_thread=False)
+    conn.execute("CREATE TABLE IF NOT EXISTS overrides (key TEXT PRIMARY KEY, dx REAL NOT NULL, dy REAL NOT NULL)")
+    if conn.execute("PRAGMA user_version").fetchone()[0] < _SCHEMA_VERSION:
+        legacy = _read_legacy_overrides()
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT OR IGNORE INTO overrides (key, dx, dy) VALUES (?, ?, ?)",
+            [(key, value["dx"], value["dy"]) for key, value in legacy.items()],
+        )
+        conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+    return conn
+
+def _connection() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = _open_connection()
+    return _conn
+
+def _write(sql: str, params: Tuple = ()) -> None:
+    global _CACHE
+    with _lock:
+        try:
+            _connection().execute(sql, params)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not save label overrides to {DB_PATH}: {e}")
+        _CACHE = None
+
+def load_overrides() -> Dict[str, Dict[str, float]]:
+    global _CACHE
+    with _lock:
+        try:
+            conn = _connection()
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if _CACHE is not None and _CACHE[0] == version:
+                return _copy_overrides(_CACHE[1])
+            data = {
+                key: {"dx": float(dx), "dy": float(dy)}
+                for key, dx, dy in conn.execute("SELECT key, dx, dy FROM overrides")
+            }
+        except sqlite3.Error as e:
+            logging.warning(f"Could not read label overrides from {DB_PATH}: {e}")
+            return {}
+        _CACHE = (version, data)
+        return _copy_overrides(data)
+
+def save_overrides(data: Dict[str, Dict[str, float]]) -> None:
+    global _CACHE
+    with _lock:
+        try:
+            conn = _connection()
+            conn.execute("BEGIN")
+            conn.execute("DELETE FROM overrides")
+            conn.executemany(
+                "INSERT INTO overrides (key, dx, dy) VALUES (?, ?, ?)",
+                [(key, float(value.get("dx", 0.0)), float(value.get("dy", 0.0))) for key, value in data.items()],
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if _conn is not None and _conn.in_transaction:
+                _conn.execute("ROLLBACK")
+            logging.warning(f"Could not save label overrides to {DB_PATH}: {e}")
+        _CACHE = None
 
 def update_override(city: str, dx: float, dy: float) -> Dict[str, Dict[str, float]]:
-    data = load_overrides()
-    entry = data.get(city, {"dx": 0.0, "dy": 0.0})
-    entry["dx"] = entry.get("dx", 0.0) + dx
-    entry["dy"] = entry.get("dy", 0.0) + dy
-    data[city] = entry
-    save_overrides(data)
-    return data
+    _write(
+        "INSERT INTO overrides (key, dx, dy) VALUES (?, ?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET dx = dx + excluded.dx, dy = dy + excluded.dy",
+        (city, float(dx), float(dy)),
+    )
+    return load_overrides()
 
 def set_override(city: str, dx: float, dy: float) -> Dict[str, Dict[str, float]]:
-    data = load_overrides()
-    data[city] = {"dx": float(dx), "dy": float(dy)}
-    save_overrides(data)
-    return data
+    _write("INSERT OR REPLACE INTO overrides (key, dx, dy) VALUES (?, ?, ?)", (city, float(dx), float(dy)))
+    return load_overrides()
+
+def set_overrides(entries: Iterable[Tuple[str, float, float]]) -> Dict[str, Dict[str, float]]:
+    """Zapisuje wiele przesunięć (miasto, dx, dy) w jednej transakcji i czyta tabelę raz."""
+    global _CACHE
+    rows = [(city, float(dx), float(dy)) for city, dx, dy in entries]
+    with _lock:
+        try:
+            conn = _connection()
+            conn.execute("BEGIN")
+            conn.executemany("INSERT OR REPLACE INTO overrides (key, dx, dy) VALUES (?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if _conn is not None and _conn.in_transaction:
+                _conn.execute("ROLLBACK")
+            logging.warning(f"Could not save label overrides to {DB_PATH}: {e}")
+        _CACHE = None
+    return load_overrides()
 
 def reset_override(city: str | None = None) -> Dict[str, Dict[str, float]]:
     if city is None:
-        data: Dict[str, Dict[str, float]] = {}
+        _write("DELETE FROM overrides")
     else:
-        data = load_overrides()
-        data.pop(city, None)
-    save_overrides(data)
-    return data
+        _write("DELETE FROM overrides WHERE key = ?", (city,))
+    return load_overrides()
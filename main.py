@@ -2,12 +2,28 @@
 """
 Główny moduł aplikacji - interfejs CLI do zarządzania trasą i generowania mapy.
 """
+from __future__ import annotations
+
 import argparse
+import re
 import sys
+from typing import TYPE_CHECKING
+
 from storage import StorageManager
-from geocoder import Geocoder
-from map_generator import MapGenerator
-from label_overrides import load_overrides
+
+# Geocoder (geopy) i MapGenerator (matplotlib) importujemy dopiero w komendach,
+# które ich używają - `show` i `clear` startują bez tych bibliotek
+if TYPE_CHECKING:
+    from geocoder import Geocoder
+
+# Dozwolone wartości opcji CLI - wspólne dla map, route i kreatora interactive
+_PAPER_FORMATS = ('A3',)
+_LINE_STYLES = ('solid', 'dashed', 'dotted', 'dashdot', 'dot')
+_POINT_STYLES = ('circle', 'square', 'triangle', 'diamond', 'cross', 'star')
+
+# Liczby wpisywane w kreatorze interactive (szerokość linii, rozmiar punktów, DPI)
+_FLOAT_RE = re.compile(r"^[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?$")
+_INT_RE = re.compile(r"^[+-]?\d+$")
 
 
 def add_city_command(storage: StorageManager, geocoder: Geocoder, city_name: str) -> None:
@@ -17,14 +33,18 @@ def add_city_command(storage: StorageManager, geocoder: Geocoder, city_name: str
     # Pobierz współrzędne
     print("Pobieranie współrzędnych...")
     coords = geocoder.get_coordinates(city_name)
-    
+    storage.add_city(*_city_row(city_name, coords))
+
+
+def _city_row(city_name: str, coords: tuple[float, float] | None, indent: str = "") -> tuple[str, float | None, float | None]:
+    """Wypisuje wynik geokodowania i zwraca wiersz (nazwa, lat, lon) do zapisu w trasie."""
     if coords:
         lat, lon = coords
-        storage.add_city(city_name, lat, lon)
-        print(f"✓ Dodano '{city_name}' (lat: {lat:.4f}, lon: {lon:.4f})")
-    else:
-        storage.add_city(city_name)  # Dodaj bez współrzędnych
-        print(f"⚠ Dodano '{city_name}', ale nie udało się pobrać współrzędnych")
+        print(f"{indent}✓ Dodano '{city_name}' (lat: {lat:.4f}, lon: {lon:.4f})")
+        return city_name, lat, lon
+    # Dodaj bez współrzędnych
+    print(f"{indent}⚠ Dodano '{city_name}', ale nie udało się pobrać współrzędnych")
+    return city_name, None, None
 
 
 def show_route_command(storage: StorageManager) -> None:
@@ -35,18 +55,19 @@ def show_route_command(storage: StorageManager) -> None:
         print("Trasa jest pusta.")
         return
     
-    print("\nAktualna trasa:")
-    print("-" * 60)
+    # Cała tabela jednym zapisem zamiast print() na każde miasto
+    lines = ["\nAktualna trasa:", "-" * 60]
     for i, city in enumerate(route, 1):
         name = city["name"]
         lat = city.get("latitude")
         lon = city.get("longitude")
         
         if lat is not None and lon is not None:
-            print(f"{i}. {name} (lat: {lat:.4f}, lon: {lon:.4f})")
+            lines.append(f"{i}. {name} (lat: {lat:.4f}, lon: {lon:.4f})")
         else:
-            print(f"{i}. {name} (brak współrzędnych)")
-    print("-" * 60)
+            lines.append(f"{i}. {name} (brak współrzędnych)")
+    lines.append("-" * 60)
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 def generate_map_command(
@@ -75,11 +96,36 @@ def generate_map_command(
     if not route:
         print("Trasa jest pusta. Dodaj miasta przed generowaniem mapy.")
         return
-    
-    generator = MapGenerator()
+
+    from label_overrides import load_overrides
+    from map_generator import MapGenerator
+
+    generator = MapGenerator(**_map_generator_kwargs(
+        background_color=background_color,
+        font_family=font_family,
+        font_color=font_color,
+        show_borders=show_borders,
+        paper_format=paper_format,
+        dpi=dpi,
+        line_style=line_style,
+        line_color=line_color,
+        line_width=line_width,
+        point_style=point_style,
+        point_color=point_color,
+        point_size=point_size,
+        title_text=title_text,
+        footer_left_text=footer_left_text,
+        footer_right_text=footer_right_text,
+        text_font_family=text_font_family,
+    ))
     generator.generate_map(route, output_file, label_overrides=load_overrides(), render_labels=True)
 
 
+def _map_generator_kwargs(**options) -> dict:
+    """Pomija opcje niepodane przez użytkownika - wartości domyślne ustala MapGenerator."""
+    return {key: value for key, value in options.items() if value is not None}
+
+
 def clear_route_command(storage: StorageManager) -> None:
     """Czyści całą trasę."""
     storage.clear_route()
@@ -112,26 +158,39 @@ def build_route_command(
     storage.clear_route()
     print("Rozpoczynam budowę nowej trasy...\n")
 
-    for city_name in cities:
+    # Współrzędne pobieramy równolegle (wspólny limit zapytań i cache w Geocoder),
+    # a miasta dodajemy w kolejności podanej przez użytkownika
+    print(f"Pobieranie współrzędnych dla {len(cities)} miast...")
+    rows = []
+    for city_name, coords in zip(cities, geocoder.get_coordinates_batch(cities)):
         print(f"• Dodawanie miasta: {city_name}")
-        coords = geocoder.get_coordinates(city_name)
-        if coords:
-            lat, lon = coords
-            storage.add_city(city_name, lat, lon)
-            print(f"  ✓ Dodano '{city_name}' (lat: {lat:.4f}, lon: {lon:.4f})")
-        else:
-            storage.add_city(city_name)
-            print(f"  ⚠ Dodano '{city_name}', ale nie udało się pobrać współrzędnych")
+        rows.append(_city_row(city_name, coords, indent="  "))
+    # Jeden zapis route.json dla całej trasy
+    storage.add_cities(rows)
+    route = storage.get_route()
 
     print("\nGenerowanie mapy dla całej trasy...")
-    generator = MapGenerator(
-        background_color=background_color or "#0a3dbb",
-        font_family=font_family or "Helvetica",
-        font_color=font_color or "#ffffff",
+    from label_overrides import load_overrides
+    from map_generator import MapGenerator
+
+    generator = MapGenerator(**_map_generator_kwargs(
+        background_color=background_color,
+        font_family=font_family,
+        font_color=font_color,
         show_borders=show_borders,
         paper_format=paper_format,
         dpi=dpi,
-    )
+        line_style=line_style,
+        line_color=line_color,
+        line_width=line_width,
+        point_style=point_style,
+        point_color=point_color,
+        point_size=point_size,
+        title_text=title_text,
+        footer_left_text=footer_left_text,
+        footer_right_text=footer_right_text,
+        text_font_family=text_font_family,
+    ))
     generator.generate_map(route, output_file, label_overrides=load_overrides(), render_labels=True)
 
 
@@ -150,6 +209,17 @@ def _prompt_yes_no(message: str, default: bool = False) -> bool:
         print("Proszę odpowiedzieć 't' (tak) lub 'n' (nie).")
 
 
+def _parse_optional_number(text: str, cast: type, pattern: re.Pattern, error_message: str, default):
+    """Zamienia wpis użytkownika na liczbę; puste lub błędne wejście daje wartość domyślną."""
+    if not text:
+        return default
+    # Walidacja wyrażeniem regularnym zamiast łapania ValueError z float()/int()
+    if not pattern.match(text):
+        print(error_message)
+        return default
+    return cast(text)
+
+
 def interactive_command(storage: StorageManager, geocoder: Geocoder) -> None:
     """Uruchamia interaktywny kreator trasy."""
     print(
@@ -175,27 +245,25 @@ def interactive_command(storage: StorageManager, geocoder: Geocoder) -> None:
     show_borders = _prompt_yes_no("Czy dodać granice państw w tle?", default=False)
 
     print("\n=== Styl linii i punktów ===")
-    line_style = input("Styl linii (solid/dashed/dotted/dashdot/dot) [ENTER=dashed]: ").strip() or None
+    line_style = input(f"Styl linii ({'/'.join(_LINE_STYLES)}) [ENTER=dashed]: ").strip() or None
     line_color = input("Kolor linii (np. #f2f4ff) [ENTER=domyślny]: ").strip() or None
-    line_width_input = input("Szerokość linii (liczba, ENTER=auto): ").strip()
-    line_width = None
-    if line_width_input:
-        try:
-            line_width = float(line_width_input)
-        except ValueError:
-            print("Nieprawidłowa szerokość linii. Używam wartości domyślnej.")
-            line_width = None
-
-    point_style = input("Kształt punktów (circle/square/triangle/diamond/cross/star) [ENTER=circle]: ").strip() or None
+    line_width = _parse_optional_number(
+        input("Szerokość linii (liczba, ENTER=auto): ").strip(),
+        float,
+        _FLOAT_RE,
+        "Nieprawidłowa szerokość linii. Używam wartości domyślnej.",
+        None,
+    )
+
+    point_style = input(f"Kształt punktów ({'/'.join(_POINT_STYLES)}) [ENTER=circle]: ").strip() or None
     point_color = input("Kolor punktów (np. #f2f4ff) [ENTER=domyślny]: ").strip() or None
-    point_size_input = input("Rozmiar punktów (liczba, ENTER=auto): ").strip()
-    point_size = None
-    if point_size_input:
-        try:
-            point_size = float(point_size_input)
-        except ValueError:
-            print("Nieprawidłowy rozmiar punktów. Używam wartości domyślnej.")
-            point_size = None
+    point_size = _parse_optional_number(
+        input("Rozmiar punktów (liczba, ENTER=auto): ").strip(),
+        float,
+        _FLOAT_RE,
+        "Nieprawidłowy rozmiar punktów. Używam wartości domyślnej.",
+        None,
+    )
 
     print("\n=== Napisy na plakacie ===")
     title_text = input("Tytuł na górze plakatu [ENTER=brak]: ").strip() or None
@@ -207,15 +275,13 @@ def interactive_command(storage: StorageManager, geocoder: Geocoder) -> None:
     dpi_value: int | None = None
     if _prompt_yes_no("Czy wygenerować plakat w formacie A3?", default=True):
         paper_format = "A3"
-        dpi_input = input("Podaj DPI (np. 300) [ENTER=300]: ").strip()
-        if dpi_input:
-            try:
-                dpi_value = int(dpi_input)
-            except ValueError:
-                print("Nieprawidłowa wartość DPI. Używam domyślnej (300).")
-                dpi_value = 300
-        else:
-            dpi_value = 300
+        dpi_value = _parse_optional_number(
+            input("Podaj DPI (np. 300) [ENTER=300]: ").strip(),
+            int,
+            _INT_RE,
+            "Nieprawidłowa wartość DPI. Używam domyślnej (300).",
+            300,
+        )
 
     output_path = input("Ścieżka pliku wyjściowego [ENTER=route_map.png]: ").strip() or "route_map.png"
 
@@ -245,33 +311,8 @@ def interactive_command(storage: StorageManager, geocoder: Geocoder) -> None:
     print("\nGotowe! Możesz znaleźć mapę pod wskazaną ścieżką.")
 
 
-def main():
-    """Główna funkcja CLI."""
-    parser = argparse.ArgumentParser(
-        description="Aplikacja do zarządzania trasą i generowania mapy",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-Przykłady użycia:
-  python main.py add "Barcelona"
-  python main.py add "Madryt"
-  python main.py show
-  python main.py map
-  python main.py map --output mapa.png
-  python main.py clear
-        """
-    )
-    
-    subparsers = parser.add_subparsers(dest='command', help='Dostępne komendy')
-    
-    # Komenda add
-    add_parser = subparsers.add_parser('add', help='Dodaj miasto do trasy')
-    add_parser.add_argument('city', type=str, help='Nazwa miasta do dodania')
-    
-    # Komenda show
-    subparsers.add_parser('show', help='Wyświetl aktualną trasę')
-    
-    # Komenda map
-    map_parser = subparsers.add_parser('map', help='Generuj mapę trasy')
+def _add_map_arguments(map_parser: argparse.ArgumentParser) -> None:
+    """Argumenty komendy map."""
     map_parser.add_argument('--output', '-o', type=str, default=None,
                             help='Ścieżka do zapisania mapy (opcjonalne)')
     map_parser.add_argument('--background', '-b', type=str, default=None,
@@ -282,12 +323,12 @@ Przykłady użycia:
                             help='Kolor podpisów miast (np. "#ffffff")')
     map_parser.add_argument('--borders', action='store_true', default=False,
                             help='Wyświetl granice państw na mapie')
-    map_parser.add_argument('--paper', type=str, choices=['A3'], default=None,
+    map_parser.add_argument('--paper', type=str, choices=_PAPER_FORMATS, default=None,
                             help='Format papieru (obecnie dostępny: A3)')
     map_parser.add_argument('--dpi', type=int, default=None,
                             help='Rozdzielczość DPI dla zapisu mapy (np. 300)')
     map_parser.add_argument('--line-style', type=str,
-                            choices=['solid', 'dashed', 'dotted', 'dashdot', 'dot'],
+                            choices=_LINE_STYLES,
                             default=None,
                             help='Styl linii trasy')
     map_parser.add_argument('--line-color', type=str, default=None,
@@ -295,7 +336,7 @@ Przykłady użycia:
     map_parser.add_argument('--line-width', type=float, default=None,
                             help='Szerokość linii trasy (domyślnie zależna od liczby przejazdów)')
     map_parser.add_argument('--point-style', type=str,
-                            choices=['circle', 'square', 'triangle', 'diamond', 'cross', 'star'],
+                            choices=_POINT_STYLES,
                             default=None,
                             help='Kształt punktów miast')
     map_parser.add_argument('--point-color', type=str, default=None,
@@ -310,15 +351,10 @@ Przykłady użycia:
                             help='Tekst w prawym dolnym rogu plakatu')
     map_parser.add_argument('--text-font', type=str, default=None,
                             help='Czcionka tytułu i podpisów (domyślnie jak podpisy miast)')
-    
-    # Komenda clear
-    subparsers.add_parser('clear', help='Wyczyść trasę')
-    
-    # Komenda route
-    route_parser = subparsers.add_parser(
-        'route',
-        help='Zastąp trasę nową listą miast i wygeneruj mapę do pliku'
-    )
+
+
+def _add_route_arguments(route_parser: argparse.ArgumentParser) -> None:
+    """Argumenty komendy route."""
     route_parser.add_argument(
         'cities',
         nargs='+',
@@ -357,7 +393,7 @@ Przykłady użycia:
     route_parser.add_argument(
         '--paper',
         type=str,
-        choices=['A3'],
+        choices=_PAPER_FORMATS,
         default=None,
         help='Format papieru (obecnie dostępny: A3)'
     )
@@ -370,7 +406,7 @@ Przykłady użycia:
     route_parser.add_argument(
         '--line-style',
         type=str,
-        choices=['solid', 'dashed', 'dotted', 'dashdot', 'dot'],
+        choices=_LINE_STYLES,
         default=None,
         help='Styl linii trasy'
     )
@@ -389,7 +425,7 @@ Przykłady użycia:
     route_parser.add_argument(
         '--point-style',
         type=str,
-        choices=['circle', 'square', 'triangle', 'diamond', 'cross', 'star'],
+        choices=_POINT_STYLES,
         default=None,
         help='Kształt punktów miast'
     )
@@ -430,83 +466,132 @@ Przykłady użycia:
         help='Czcionka tytułu i podpisów (domyślnie jak podpisy miast)'
     )
 
-    # Komenda interactive
-    subparsers.add_parser(
-        'interactive',
-        help='Uruchom interaktywny kreator trasy'
+
+def _new_geocoder() -> Geocoder:
+    from geocoder import Geocoder
+    return Geocoder()
+
+
+def _style_kwargs(args: argparse.Namespace) -> dict:
+    """Opcje wyglądu wspólne dla komend map i route."""
+    return dict(
+        background_color=args.background,
+        font_family=args.font,
+        font_color=args.font_color,
+        show_borders=args.borders,
+        paper_format=args.paper,
+        dpi=args.dpi,
+        line_style=args.line_style,
+        line_color=args.line_color,
+        line_width=args.line_width,
+        point_style=args.point_style,
+        point_color=args.point_color,
+        point_size=args.point_size,
+        title_text=args.title,
+        footer_left_text=args.footer_left,
+        footer_right_text=args.footer_right,
+        text_font_family=args.text_font,
     )
 
-    args = parser.parse_args()
-    
-    if not args.command:
-        parser.print_help()
-        sys.exit(1)
-    
-    # Inicjalizuj moduły
+
+def _run_add(args: argparse.Namespace) -> None:
     storage = StorageManager()
-    geocoder = Geocoder()
-    
-    # Wykonaj komendę
-    if args.command == 'add':
-        add_city_command(storage, geocoder, args.city)
-        # Po dodaniu miasta automatycznie generuj mapę
+    add_city_command(storage, _new_geocoder(), args.city)
+    # Render jest najdroższą operacją - przy dodawaniu kolejnych miast tylko na życzenie
+    if args.render:
         print("\nGenerowanie mapy...")
         generate_map_command(storage)
+
+
+def _run_show(args: argparse.Namespace) -> None:
+    show_route_command(StorageManager())
+
+
+def _run_map(args: argparse.Namespace) -> None:
+    generate_map_command(StorageManager(), output_file=args.output, **_style_kwargs(args))
+
+
+def _run_clear(args: argparse.Namespace) -> None:
+    clear_route_command(StorageManager())
+
+
+def _run_route(args: argparse.Namespace) -> None:
+    build_route_command(StorageManager(), _new_geocoder(), args.cities, args.output, **_style_kwargs(args))
+
+
+def _run_interactive(args: argparse.Namespace) -> None:
+    interactive_command(StorageManager(), _new_geocoder())
+
+
+_COMMAND_HANDLERS = {
+    'add': _run_add,
+    'show': _run_show,
+    'map': _run_map,
+    'clear': _run_clear,
+    'route': _run_route,
+    'interactive': _run_interactive,
+}
+
+
+def main():
+    """Główna funkcja CLI."""
+    # Argumenty map/route (~20 każda) budujemy tylko dla wywołanej komendy;
+    # przy --help, braku lub nieznanej komendzie budujemy wszystkie
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    build_all = command not in _COMMAND_HANDLERS
+
+    parser = argparse.ArgumentParser(
+        description="Aplikacja do zarządzania trasą i generowania mapy",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Przykłady użycia:
+  python main.py add "Barcelona"
+  python main.py add "Madryt"
+  python main.py show
+  python main.py map
+  python main.py map --output mapa.png
+  python main.py clear
+        """
+    )
     
-    elif args.command == 'show':
-        show_route_command(storage)
+    # Brak komendy kończy się błędem argparse, zanim cokolwiek zostanie zainicjalizowane
+    subparsers = parser.add_subparsers(dest='command', required=True, help='Dostępne komendy')
     
-    elif args.command == 'map':
-        generate_map_command(
-            storage,
-            output_file=args.output,
-            background_color=args.background,
-            font_family=args.font,
-            font_color=args.font_color,
-            show_borders=args.borders,
-            paper_format=args.paper,
-            dpi=args.dpi,
-            line_style=args.line_style,
-            line_color=args.line_color,
-            line_width=args.line_width,
-            point_style=args.point_style,
-            point_color=args.point_color,
-            point_size=args.point_size,
-            title_text=args.title,
-            footer_left_text=args.footer_left,
-            footer_right_text=args.footer_right,
-            text_font_family=args.text_font,
-        )
+    # Komenda add
+    add_parser = subparsers.add_parser('add', help='Dodaj miasto do trasy')
+    add_parser.add_argument('city', type=str, help='Nazwa miasta do dodania')
+    add_parser.add_argument('--render', action='store_true', default=False,
+                            help='Po dodaniu miasta od razu wygeneruj mapę (domyślnie: python main.py map na końcu)')
     
-    elif args.command == 'clear':
-        clear_route_command(storage)
-
-    elif args.command == 'route':
-        build_route_command(
-            storage,
-            geocoder,
-            args.cities,
-            args.output,
-            background_color=args.background,
-            font_family=args.font,
-            font_color=args.font_color,
-            show_borders=args.borders,
-            paper_format=args.paper,
-            dpi=args.dpi,
-            line_style=args.line_style,
-            line_color=args.line_color,
-            line_width=args.line_width,
-            point_style=args.point_style,
-            point_color=args.point_color,
-            point_size=args.point_size,
-            title_text=args.title,
-            footer_left_text=args.footer_left,
-            footer_right_text=args.footer_right,
-            text_font_family=args.text_font,
-        )
+    # Komenda show
+    subparsers.add_parser('show', help='Wyświetl aktualną trasę')
+    
+    # Komenda map
+    map_parser = subparsers.add_parser('map', help='Generuj mapę trasy')
+    if build_all or command == 'map':
+        _add_map_arguments(map_parser)
+    
+    # Komenda clear
+    subparsers.add_parser('clear', help='Wyczyść trasę')
+    
+    # Komenda route
+    route_parser = subparsers.add_parser(
+        'route',
+        help='Zastąp trasę nową listą miast i wygeneruj mapę do pliku'
+    )
+    if build_all or command == 'route':
+        _add_route_arguments(route_parser)
+
+    # Komenda interactive
+    subparsers.add_parser(
+        'interactive',
+        help='Uruchom interaktywny kreator trasy'
+    )
+
+    args = parser.parse_args()
 
-    elif args.command == 'interactive':
-        interactive_command(storage, geocoder)
+    # Każda komenda sama tworzy to, czego potrzebuje (Geocoder tylko przy geokodowaniu)
+    _COMMAND_HANDLERS[args.command](args)
 
 
 if __name__ == "__main__":
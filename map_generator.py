@@ -1,105 +1,297 @@
 """
 Moduł generowania minimalistycznej mapy z trasą.
 """
+import io
+import json
+import math
 import os
-from collections import Counter, defaultdict
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from types import MappingProxyType
+from typing import Any, ClassVar, Dict, List, NamedTuple, Optional, Tuple
 
 # Configure matplotlib cache directory for Vercel (must be before importing matplotlib)
 if os.environ.get("VERCEL") == "1":
     os.environ["MPLCONFIGDIR"] = "/tmp/matplotlib"
 
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
 import numpy as np
-import requests
-from matplotlib.collections import PolyCollection
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg, RendererAgg
+from matplotlib.collections import LineCollection, PathCollection
+from matplotlib.figure import Figure
+from matplotlib.path import Path as MplPath
+from matplotlib.text import Text
 from PIL import Image
+
+from paper_formats import PAPER_FORMATS, POSTER_100X60, POSTER_50X70, POSTER_60X100, POSTER_70X50, PaperSpec
+
 try:
     from adjustText import adjust_text  # type: ignore
     _ADJUST_TEXT_AVAILABLE = True
 except Exception:
     _ADJUST_TEXT_AVAILABLE = False
+try:
+    import orjson  # type: ignore
+    _ORJSON_AVAILABLE = True
+except Exception:
+    _ORJSON_AVAILABLE = False
 
 
 BASE_DIR = Path(__file__).resolve().parent
+IS_VERCEL = os.environ.get("VERCEL") == "1"
+TMP_DIR = Path(os.environ.get("TMPDIR") or "/tmp")
+
+# Granice państw pobrane raz zapisujemy lokalnie (na Vercelu tylko /tmp jest zapisywalny)
+if IS_VERCEL:
+    BORDERS_CACHE_PATH = TMP_DIR / "borders.npz"
+else:
+    BORDERS_CACHE_PATH = BASE_DIR / ".cache" / "borders.npz"
+# Surowy GeoJSON obok - po zmianie formatu .npz nie trzeba pobierać go ponownie
+BORDERS_GEOJSON_PATH = BORDERS_CACHE_PATH.with_suffix(".geojson")
+# Po 30 dniach pliki lokalne uznajemy za nieaktualne i pobieramy granice ponownie
+BORDERS_CACHE_MAX_AGE = 30 * 24 * 3600
+BORDERS_URL = (
+    "https://raw.githubusercontent.com/nvkelso/"
+    "natural-earth-vector/master/geojson/"
+    "ne_110m_admin_0_countries.geojson"
+)
+
+# Domyślny wygląd mapy - jedno źródło dla CLI, API i klas generatorów
+DEFAULT_BACKGROUND_COLOR = "#0a3dbb"
+DEFAULT_FONT_FAMILY = "Helvetica"
+DEFAULT_FONT_COLOR = "#ffffff"
+DEFAULT_DPI = 300
+DEFAULT_LINE_STYLE = "dashed"
+DEFAULT_LINE_COLOR = "#f2f4ff"
+DEFAULT_POINT_STYLE = "circle"
+DEFAULT_POINT_COLOR = "#f2f4ff"
+
+# Baza Bernsteina krzywej Béziera drugiego stopnia w 50 punktach - liczona raz.
+# Kolumny: (1-t)^2, 2(1-t)t, t^2; kształt (50, 3)
+_CURVE_T = np.linspace(0, 1, 50)[:, None]
+_BEZIER_BASIS = np.hstack([(1 - _CURVE_T) ** 2, 2 * (1 - _CURVE_T) * _CURVE_T, _CURVE_T ** 2])
+
+# Kierunki kardynalne dla wyboru strony etykiety (tylko do odczytu)
+_DIR_INDEX = {"N": 0, "E": 1, "S": 2, "W": 3}
+_CARDINAL_VECTORS = np.array([[0.0, 1.0], [1.0, 0.0], [0.0, -1.0], [-1.0, 0.0]], dtype=np.float64)
+_CARDINAL_VECTORS.flags.writeable = False
+_OPPOSITE_DIR = {"N": "S", "S": "N", "E": "W", "W": "E"}
+_PREFERRED_DIRS = ("N", "E", "S", "W")
+# Kierunek etykiety dla każdej pary (kierunek z poprzedniego miasta, kierunek do następnego):
+# przeciwny do poprzedniego odcinka, następnego, albo domyślnie pierwszy z preferowanych
+_LABEL_DIR_TABLE: Dict[Tuple[Optional[str], Optional[str]], np.ndarray] = {
+    (prev_dir, next_dir): _CARDINAL_VECTORS[
+        _DIR_INDEX[_OPPOSITE_DIR[prev_dir or next_dir] if prev_dir or next_dir else _PREFERRED_DIRS[0]]
+    ]
+    for prev_dir in (None, *_PREFERRED_DIRS)
+    for next_dir in (None, *_PREFERRED_DIRS)
+}
+
+
+class _OverlaySpec(NamedTuple):
+    """Tytuł lub stopka: slot artysty, położenie, tekst i właściwości Text."""
+
+    slot: str
+    x: float
+    y: float
+    text: str
+    props: Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class _Cities:
+    """Miasta trasy jako struktura tablic: nazwy i ciągła tablica (N, 2) lon/lat."""
+
+    names: List[str]
+    lonlat: np.ndarray
+
+    @classmethod
+    def from_route(cls, cities: List[Dict]) -> "_Cities":
+        lonlat = np.fromiter(
+            (value for city in cities for value in (city["longitude"], city["latitude"])),
+            dtype=np.float64,
+            count=2 * len(cities),
+        ).reshape(-1, 2)
+        return cls(names=[city["name"] for city in cities], lonlat=lonlat)
+
+
+def _norm2(v) -> float:
+    """Długość wektora 2D - math.sqrt na skalarach zamiast np.linalg.norm."""
+    return math.sqrt(v[0] * v[0] + v[1] * v[1])
+
+
+def _simplify_ring(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Upraszcza łamaną algorytmem Ramera-Douglasa-Peuckera (iteracyjnie, bez rekurencji).
+    Zachowuje pierwszy i ostatni punkt; tolerance w jednostkach współrzędnych.
+    """
+    count = len(points)
+    if count < 3 or tolerance <= 0:
+        return points
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        inner = points[first + 1:last]
+        start = points[first]
+        seg = points[last] - start
+        rel = inner - start
+        seg_len = math.sqrt(seg[0] * seg[0] + seg[1] * seg[1])
+        if seg_len > 0:
+            # Odległość od prostej przez końce odcinka (iloczyn wektorowy)
+            dist = np.abs(rel[:, 0] * seg[1] - rel[:, 1] * seg[0]) / seg_len
+        else:
+            # Zamknięty pierścień - końce w tym samym punkcie
+            dist = np.sqrt((rel * rel).sum(axis=1))
+        idx = int(np.argmax(dist))
+        if dist[idx] > tolerance:
+            split = first + 1 + idx
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return points[keep]
+
+
+def _solve_label_positions_numpy(
+    positions_px: np.ndarray,
+    anchors_px: np.ndarray,
+    half_w: np.ndarray,
+    half_h: np.ndarray,
+    seg_start_px: np.ndarray,
+    seg_end_px: np.ndarray,
+    locked: np.ndarray,
+    min_line_distance_px: float,
+    min_label_distance_px: float,
+    max_anchor_distance_px: float,
+    max_iterations: int,
+) -> np.ndarray:
+    """
+    Iteracyjnie odsuwa etykiety od linii trasy i od siebie nawzajem (współrzędne w pikselach).
+    """
+    positions_px = positions_px.copy()
+    seg_vec = seg_end_px - seg_start_px
+    seg_len_sq = np.einsum("ij,ij->i", seg_vec, seg_vec)
+    # Kierunek prostopadły do odcinka - gdy etykieta leży dokładnie na linii
+    seg_normal = np.column_stack([-seg_vec[:, 1], seg_vec[:, 0]])
+    up = np.array([0.0, 1.0])
+    pad = 2.0 * min_label_distance_px
+    # Zablokowane etykiety się nie ruszają - są tylko przeszkodami, iterujemy po wolnych
+    free = np.flatnonzero(~locked)
+    if not len(free):
+        return positions_px
+
+    for _ in range(max_iterations):
+        moved = False
+        # Etykiety przesuwane po kolei - kolejne widzą już nowe pozycje poprzednich
+        for idx in free:
+            pos_px = positions_px[idx].copy()
+            shift = np.zeros(2, dtype=float)
+            pushes: List[np.ndarray] = []
+
+            if len(seg_start_px):
+                # Najbliższe punkty na wszystkich odcinkach naraz
+                diff = pos_px - seg_start_px
+                t = np.divide(
+                    np.einsum("ij,ij->i", diff, seg_vec),
+                    seg_len_sq,
+                    out=np.zeros_like(seg_len_sq),
+                    where=seg_len_sq > 0,
+                )
+                np.clip(t, 0.0, 1.0, out=t)
+                direction = pos_px - (seg_start_px + t[:, None] * seg_vec)
+                distance = np.sqrt(np.einsum("ij,ij->i", direction, direction))
+                near = distance < min_line_distance_px
+                if near.any():
+                    direction = direction[near]
+                    on_line = np.all(np.abs(direction) <= 1e-8, axis=1)
+                    direction[on_line] = seg_normal[near][on_line]
+                    degenerate = np.all(np.abs(direction) <= 1e-8, axis=1)
+                    direction[degenerate] = up
+                    direction /= np.sqrt(np.einsum("ij,ij->i", direction, direction))[:, None]
+                    pushes.append(direction * (min_line_distance_px - distance[near] + 1.0)[:, None])
+
+            # Nakładanie prostokątów etykiet (z marginesem z obu stron) - wszystkie pary naraz
+            overlap = (
+                (np.abs(positions_px[:, 0] - pos_px[0]) <= half_w + half_w[idx] + pad)
+                & (np.abs(positions_px[:, 1] - pos_px[1]) <= half_h + half_h[idx] + pad)
+            )
+            overlap[idx] = False
+            if overlap.any():
+                delta = pos_px - positions_px[overlap]
+                coincident = np.all(np.abs(delta) <= 1e-8, axis=1)
+                delta[coincident] = up
+                delta /= np.sqrt(np.einsum("ij,ij->i", delta, delta))[:, None]
+                pushes.append(delta * (min_label_distance_px / 2))
+
+            if pushes:
+                shift = np.concatenate(pushes).sum(axis=0)
+            shift += (pos_px - anchors_px[idx]) * -0.03
+
+            if np.sqrt(shift @ shift) > 0.4:
+                new_pos = pos_px + shift
+                offset = new_pos - anchors_px[idx]
+                offset_len = np.sqrt(offset @ offset)
+                if offset_len > max_anchor_distance_px:
+                    new_pos = anchors_px[idx] + offset * (max_anchor_distance_px / offset_len)
+                positions_px[idx] = new_pos
+                moved = True
+
+        if not moved:
+            break
+
+    return positions_px
 
 
 class MapGenerator:
     """Generuje minimalistyczną mapę z połączeniami między miejscami."""
 
     MM_PER_INCH = 25.4
-    PAPER_FORMATS: Dict[str, Dict[str, Any]] = {
-        "A4": {
-            "label": "A4 (210 × 297 mm)",
-            "width_mm": 210.0,
-            "height_mm": 297.0,
-        },
-        "A3": {
-            "label": "A3 (297 × 420 mm)",
-            "width_mm": 297.0,
-            "height_mm": 420.0,
-        },
-        "POSTER_50X70": {
-            "label": "Plakat 50 × 70 cm",
-            "width_mm": 500.0,
-            "height_mm": 700.0,
-        },
-        "POSTER_70X50": {
-            "label": "Plakat 70 × 50 cm",
-            "width_mm": 700.0,
-            "height_mm": 500.0,
-        },
-        "POSTER_60X100": {
-            "label": "Plakat 60 × 100 cm",
-            "width_mm": 600.0,
-            "height_mm": 1000.0,
-        },
-        "POSTER_100X60": {
-            "label": "Plakat 100 × 60 cm",
-            "width_mm": 1000.0,
-            "height_mm": 600.0,
-        },
-        "SQUARE": {
-            "label": "Kwadrat 1 : 1 (50 × 50 cm)",
-            "width_mm": 500.0,
-            "height_mm": 500.0,
-        },
-        "RECTANGLE_3X2": {
-            "label": "Prostokąt 3 : 2 (60 × 40 cm)",
-            "width_mm": 600.0,
-            "height_mm": 400.0,
-        },
-        "POSTCARD": {
-            "label": "Pocztówka 10 × 15 cm (4 × 6 cali)",
-            "width_mm": 100.0,
-            "height_mm": 150.0,
-        },
-    }
+    # Granice państw wspólne dla wszystkich instancji - aplikacja webowa tworzy generator na każde żądanie
+    _BORDER_SHAPES_CACHE: ClassVar[Optional[List[np.ndarray]]] = None
+    _BORDER_LOCK: ClassVar[threading.Lock] = threading.Lock()
+    # Figury wielokrotnego użytku, klucz (szerokość, wysokość, dpi).
+    # Na Vercelu wyłączone - bufor Agg plakatu w 300 dpi to setki MB pamięci funkcji.
+    _FIGURE_POOL: ClassVar[Dict[Tuple[float, float, float], Figure]] = {}
+    _FIGURE_POOL_SIZE: ClassVar[int] = 0 if IS_VERCEL else 2
+    _FIGURE_LOCK: ClassVar[threading.Lock] = threading.Lock()
+    # Wspólne wątki zapisu dla async_save (zlib w PIL zwalnia GIL)
+    _SAVE_EXECUTOR: ClassVar[ThreadPoolExecutor] = ThreadPoolExecutor(max_workers=2, thread_name_prefix="map-save")
+    # Wymiary etykiet w pikselach (szerokość, wysokość) między renderami, klucz: tekst, czcionka i dpi
+    _TEXT_EXTENT_CACHE: ClassVar[Dict[Tuple[Any, ...], Tuple[float, float]]] = {}
+    _TEXT_EXTENT_CACHE_SIZE: ClassVar[int] = 4096
+    # gid artystów tytułu i stopek, które figura z puli zachowuje między mapami
+    _OVERLAY_GID_PREFIX: ClassVar[str] = "map-overlay:"
+
+    PAPER_FORMATS: Dict[str, PaperSpec] = PAPER_FORMATS
 
     def __init__(
         self,
         figsize: Tuple[int, int] = (12, 8),
         min_margin_deg: float = 1.0,
         max_margin_factor: float = 0.15,
-        background_color: str = "#0a3dbb",
-        font_family: str = "Helvetica",
-        font_color: str = "#ffffff",
+        background_color: str = DEFAULT_BACKGROUND_COLOR,
+        font_family: str = DEFAULT_FONT_FAMILY,
+        font_color: str = DEFAULT_FONT_COLOR,
         curve_strength: float = 0.25,
         show_borders: bool = False,
         border_edgecolor: str = "#c2c2c2",
         border_linewidth: float = 0.6,
         border_alpha: float = 0.6,
         paper_format: Optional[str] = None,
-        dpi: int = 300,
-        line_style: str = "dashed",
-        line_color: str = "#f2f4ff",
+        dpi: int = DEFAULT_DPI,
+        line_style: str = DEFAULT_LINE_STYLE,
+        line_color: str = DEFAULT_LINE_COLOR,
         line_width: Optional[float] = None,
-        point_style: str = "circle",
-        point_color: str = "#f2f4ff",
+        point_style: str = DEFAULT_POINT_STYLE,
+        point_color: str = DEFAULT_POINT_COLOR,
         point_size: Optional[float] = None,
         title_text: Optional[str] = None,
         footer_left_text: Optional[str] = None,
@@ -112,6 +304,8 @@ class MapGenerator:
         signature_scale: Optional[float] = None,
         merge_bidirectional_routes: bool = False,
         lock_paper_orientation: bool = False,
+        async_save: bool = False,
+        border_simplify_px: float = 0.5,
     ):
         self.figsize = figsize
         self.min_margin_deg = min_margin_deg
@@ -124,9 +318,28 @@ class MapGenerator:
         self.border_edgecolor = border_edgecolor
         self.border_linewidth = border_linewidth
         self.border_alpha = border_alpha
+        # Tolerancja upraszczania granic w pikselach wyjściowych (0 wyłącza)
+        self.border_simplify_px = border_simplify_px
         self.paper_format = paper_format.upper() if paper_format else None
+        # Wymiary papieru w calach (szerokość, wysokość) liczone raz; None bez formatu lub dla nieznanego
+        self._paper_inches: Optional[Tuple[float, float]] = None
+        paper_spec = self.PAPER_FORMATS.get(self.paper_format) if self.paper_format else None
+        if paper_spec and paper_spec.width_mm > 0.0 and paper_spec.height_mm > 0.0:
+            self._paper_inches = (paper_spec.width_mm / self.MM_PER_INCH, paper_spec.height_mm / self.MM_PER_INCH)
         self.dpi = dpi
         self.margin_factor = max_margin_factor
+        # Parametry zależne tylko od formatu - liczone raz, nie przy każdym generate_map.
+        # Pocztówki: 50% mniejsze marginesy geograficzne (większy zoom) i mniejsza czcionka (10x15 cm)
+        postcard_scale = 0.5 if self.paper_format == "POSTCARD" else 1.0
+        self._min_margin = self.min_margin_deg * postcard_scale
+        self._margin_factor_lat = self.margin_factor * postcard_scale
+        self._margin_factor_lon = self.margin_factor * postcard_scale
+        self._label_font_pt = 8.0 if self.paper_format == "POSTCARD" else 11.0
+        # Położenie osi (left, bottom, width, height) w ułamkach figury.
+        # Pocztówki: mapa zajmuje więcej miejsca - mniejsze marginesy wizualne
+        self._axes_rect: Tuple[float, float, float, float] = (
+            (0.05, 0.10, 0.90, 0.80) if self.paper_format == "POSTCARD" else (0.0, 0.0, 1.0, 1.0)
+        )
         self.line_style = line_style
         self.line_color = line_color
         self.line_width = line_width
@@ -152,15 +365,22 @@ class MapGenerator:
         self.signature_margin_fraction = 0.06
         self.merge_bidirectional_routes = bool(merge_bidirectional_routes)
         self.lock_paper_orientation = bool(lock_paper_orientation)
+        # Kodowanie PNG w tle - generate_map wraca od razu, wait_for_saves() czeka na pliki
+        self.async_save = bool(async_save)
+        self._pending_saves: List[Future] = []
 
         self._border_shapes_cache: Optional[List[np.ndarray]] = None
         self._border_error: Optional[Exception] = None
+        # Przeskalowane podpisy - ta sama instancja często renderuje wiele map
+        self._signature_cache: Dict[Tuple[str, int, int, int], Image.Image] = {}
+        # Tytuł i stopki nie zależą od trasy - przy serii map budujemy je raz
+        self._overlay_specs: List[_OverlaySpec] = self._build_overlay_specs()
 
     @classmethod
     def available_paper_formats(cls) -> List[Dict[str, str]]:
         """Zwraca listę dostępnych formatów papieru wraz z etykietami."""
         return [
-            {"id": key, "label": spec.get("label", key)}
+            {"id": key, "label": spec.label}
             for key, spec in cls.PAPER_FORMATS.items()
         ]
     
@@ -177,7 +397,7 @@ class MapGenerator:
         
         Args:
             route: Lista słowników z kluczami 'name', 'latitude', 'longitude'
-            output_file: Opcjonalna ścieżka do zapisania mapy (jeśli None, wyświetla)
+            output_file: Opcjonalna ścieżka do zapisania mapy (jeśli None, zwraca tylko metadane)
             hidden_labels: Zbiór nazw miast do ukrycia
         """
         # Filtruj miasta z poprawnymi współrzędnymi
@@ -190,122 +410,117 @@ class MapGenerator:
             print("Brak miast z poprawnymi współrzędnymi do wyświetlenia.")
             return
         
-        # Wyciągnij współrzędne
-        lats = [city["latitude"] for city in valid_cities]
-        lons = [city["longitude"] for city in valid_cities]
-        names = [city["name"] for city in valid_cities]
-        
+        # Wyciągnij współrzędne raz do tablicy (N, 2) lon/lat
+        cities = _Cities.from_route(valid_cities)
+        points = cities.lonlat
+        lons = points[:, 0]
+        lats = points[:, 1]
+        names = cities.names
+        min_lon, min_lat = (float(value) for value in points.min(axis=0))
+        max_lon, max_lat = (float(value) for value in points.max(axis=0))
+
         # Oblicz zakresy i marginesy, aby zdecydować o orientacji papieru
-        lat_span = max(lats) - min(lats) if len(lats) > 1 else 0.0
-        lon_span = max(lons) - min(lons) if len(lons) > 1 else 0.0
+        lat_span = max_lat - min_lat if len(lats) > 1 else 0.0
+        lon_span = max_lon - min_lon if len(lons) > 1 else 0.0
 
         # Add margins around the route to make room for labels
-        # Dla pocztówek zmniejsz minimalny margines, aby uzyskać większy zoom
-        min_margin = self.min_margin_deg * 0.5 if self.paper_format == "POSTCARD" else self.min_margin_deg
-        margin_lat = max(min_margin, lat_span * self._margin_factor_lat(lat_span))
-        margin_lon = max(min_margin, lon_span * self._margin_factor_lon(lon_span))
+        margin_lat = max(self._min_margin, lat_span * self._margin_factor_lat)
+        margin_lon = max(self._min_margin, lon_span * self._margin_factor_lon)
 
-        lat_min = min(lats) - margin_lat
-        lat_max = max(lats) + margin_lat
-        lon_min = min(lons) - margin_lon
-        lon_max = max(lons) + margin_lon
+        lat_min = min_lat - margin_lat
+        lat_max = max_lat + margin_lat
+        lon_min = min_lon - margin_lon
+        lon_max = max_lon + margin_lon
 
         # Dobierz rozmiar figury (format papieru lub domyślne)
         figsize = self.figsize
-        if self.paper_format:
-            paper_spec = self.PAPER_FORMATS.get(self.paper_format)
-            if paper_spec:
-                width_mm = float(paper_spec.get("width_mm", 0.0))
-                height_mm = float(paper_spec.get("height_mm", 0.0))
-                if width_mm > 0.0 and height_mm > 0.0:
-                    width_in = width_mm / self.MM_PER_INCH
-                    height_in = height_mm / self.MM_PER_INCH
-                    if (not self.lock_paper_orientation) and lon_span > lat_span and width_in < height_in:
-                        width_in, height_in = height_in, width_in
-                    elif (not self.lock_paper_orientation) and lon_span < lat_span and width_in > height_in:
-                        width_in, height_in = height_in, width_in
-                    figsize = (width_in, height_in)
-            else:
-                print(
-                    f"⚠ Nieznany format papieru '{self.paper_format}'. "
-                    "Używam domyślnego rozmiaru."
-                )
+        if self._paper_inches:
+            width_in, height_in = self._paper_inches
+            # Obróć papier zgodnie z kształtem trasy (przy równych rozpiętościach bez zmian)
+            if not self.lock_paper_orientation and lon_span != lat_span and (lon_span > lat_span) != (width_in > height_in):
+                width_in, height_in = height_in, width_in
+            figsize = (width_in, height_in)
+        elif self.paper_format and self.paper_format not in self.PAPER_FORMATS:
+            print(
+                f"⚠ Nieznany format papieru '{self.paper_format}'. "
+                "Używam domyślnego rozmiaru."
+            )
 
-        # Utwórz figurę
-        fig, ax = plt.subplots(figsize=figsize, dpi=self.dpi)
+        # Utwórz figurę (z puli, bez pyplot i jego globalnego rejestru figur)
+        fig, ax = self._acquire_figure(figsize)
         fig.patch.set_facecolor(self.background_color)
         ax.set_facecolor(self.background_color)
         ax.set_aspect('equal', adjustable='box')
         
         # Rysuj połączenia między kolejnymi miastami jako delikatnie zakrzywione linie
         if len(valid_cities) > 1:
-            segment_keys = [
-                (names[i], names[i + 1], i) for i in range(len(valid_cities) - 1)
-            ]
+            # Numer przejazdu i liczba przejazdów każdym odcinkiem, potem wszystkie krzywe naraz
+            occurrence, totals = self._segment_multiplicity(names, self.merge_bidirectional_routes)
             if self.merge_bidirectional_routes:
-                occurrence_tracker = defaultdict(int)
+                # Trasy tam i z powrotem rysujemy jedną linią
+                index_arr = np.flatnonzero(occurrence == 0)
+                drawn_occurrence = np.zeros(len(index_arr), dtype=int)
+                drawn_total = np.ones(len(index_arr), dtype=int)
             else:
-                occurrence_tracker = defaultdict(int)
-                pair_counts = Counter((key[0], key[1]) for key in segment_keys)
-
-            for idx, (start_name, end_name, i) in enumerate(segment_keys):
-                if self.merge_bidirectional_routes:
-                    canonical = tuple(sorted((start_name, end_name)))
-                    occurrence_idx = occurrence_tracker[canonical]
-                    occurrence_tracker[canonical] += 1
-                    if occurrence_idx > 0:
-                        continue
-                    total_occurrences = 1
-                else:
-                    occurrence_idx = occurrence_tracker[(start_name, end_name)]
-                    occurrence_tracker[(start_name, end_name)] += 1
-                    total_occurrences = pair_counts[(start_name, end_name)]
-
-                curve = self._build_curve(
-                    (lons[i], lats[i]),
-                    (lons[i + 1], lats[i + 1]),
-                    occurrence_idx=occurrence_idx,
-                    total_occurrences=total_occurrences,
-                )
+                index_arr = np.arange(len(occurrence))
+                drawn_occurrence = occurrence
+                drawn_total = totals
+
+            starts = points[index_arr]
+            ends = points[index_arr + 1]
+            curves = self._build_curves_batch(starts, ends, drawn_occurrence, drawn_total)
+            # Odcinek o zerowej długości (to samo miejsce dwa razy) rysujemy jak dotąd z dwóch punktów
+            degenerate = np.all(np.abs(ends - starts) <= 1e-8, axis=1)
+
+            linestyle, marker_line = self._resolve_line_style(self.line_style)
+            curve_segments: List[np.ndarray] = []
+            curve_linewidths: List[float] = []
+            for idx, total_occurrences in enumerate(drawn_total):
+                curve = np.vstack([starts[idx], ends[idx]]) if degenerate[idx] else curves[idx]
                 base_linewidth = (
                     self.line_width
                     if self.line_width is not None
                     else (2.2 if total_occurrences == 1 else 1.6)
                 )
-                linestyle, marker_line = self._resolve_line_style(self.line_style)
-                line_kwargs = {
-                    "color": self.line_color,
-                    "alpha": 0.85,
-                    "label": "Trasa" if idx == 0 else None,
-                }
 
                 if marker_line:
                     # Użyj markevery jako ułamka, aby zapewnić równomierne rozmieszczenie markerów
                     # niezależnie od długości linii. Mniejsza wartość = gęstsze rozmieszczenie.
                     markevery_value = 0.01  # Gęste rozmieszczenie - marker co 1% długości linii
-                    line_kwargs.update(
-                        {
-                            "linestyle": "None",
-                            "marker": marker_line,
-                            "markersize": self.line_width or 5.0,
-                            "markerfacecolor": self.line_color,
-                            "markeredgecolor": self.line_color,
-                            "markeredgewidth": 0.0,
-                            "markevery": markevery_value,  # Równomierne rozmieszczenie niezależnie od długości
-                        }
+                    ax.plot(
+                        curve[:, 0],
+                        curve[:, 1],
+                        color=self.line_color,
+                        alpha=0.85,
+                        label="Trasa" if idx == 0 else None,
+                        linestyle="None",
+                        marker=marker_line,
+                        markersize=self.line_width or 5.0,
+                        markerfacecolor=self.line_color,
+                        markeredgecolor=self.line_color,
+                        markeredgewidth=0.0,
+                        markevery=markevery_value,  # Równomierne rozmieszczenie niezależnie od długości
                     )
                 else:
-                    line_kwargs.update(
-                        {
-                            "linestyle": linestyle,
-                            "linewidth": base_linewidth,
-                        }
-                    )
-
-                ax.plot(
-                    curve[:, 0],
-                    curve[:, 1],
-                    **line_kwargs,
+                    curve_segments.append(curve)
+                    curve_linewidths.append(base_linewidth)
+
+            if curve_segments:
+                # Wszystkie odcinki jako jeden artysta zamiast osobnej Line2D na każdy odcinek.
+                # Cap/join jak w Line2D, żeby wygląd linii się nie zmienił.
+                ax.add_collection(
+                    LineCollection(
+                        curve_segments,
+                        colors=self.line_color,
+                        linewidths=curve_linewidths,
+                        linestyles=linestyle,
+                        alpha=0.85,
+                        capstyle="projecting" if linestyle == "-" else "butt",
+                        joinstyle="round",
+                        zorder=2,
+                        label="Trasa",
+                    ),
+                    autolim=False,
                 )
         
         # Rysuj punkty miast
@@ -320,68 +535,59 @@ class MapGenerator:
             label='Miasta'
         )
         
-        hidden_labels_set = hidden_labels or set()
-        unique_cities: List[Dict] = []
-        seen_names: set[str] = set()
-        for city in route:
-            city_name = city.get("name", "")
-            # Skip hidden labels
-            if city_name in hidden_labels_set:
-                continue
-            if city_name not in seen_names:
-                seen_names.add(city_name)
-                unique_cities.append(city)
+        # Jedna etykieta na miasto (pierwsze wystąpienie w trasie), bez ukrytych
+        route_names = np.asarray([city.get("name", "") for city in route], dtype=object)
+        _, first_idx = np.unique(route_names, return_index=True)
+        keep = np.zeros(len(route), dtype=bool)
+        keep[first_idx] = True
+        if hidden_labels:
+            keep &= ~np.isin(route_names, list(hidden_labels))
+        unique_cities: List[Dict] = [route[i] for i in np.flatnonzero(keep)]
 
         # Calculate a small vertical offset based ONLY on latitude span so that
         # long poziome trasy nie powodują „odjechania” etykiet w pionie.
-        lon_span_raw = max(lons) - min(lons) if len(lons) > 1 else 0.0
-        lat_span_raw = max(lats) - min(lats) if len(lats) > 1 else 0.0
         # Minimalny offset: ok. 0.1% wysokości mapy – etykiety bardzo blisko punktów.
-        label_offset_y = lat_span_raw * 0.001
+        label_offset_y = lat_span * 0.001
         if label_offset_y == 0.0:
             label_offset_y = 0.001  # fallback dla pojedynczego punktu
         
-        texts: List[plt.Text] = []
+        label_positions: List[Tuple[float, float]] = []
         for city in unique_cities:
             lon, lat = city["longitude"], city["latitude"]
             ov = (label_overrides or {}).get(city["name"]) if label_overrides else None
             if ov is None:
                 # No override: place label very close above point
-                target_x = lon
-                target_y = lat + label_offset_y
+                label_positions.append((lon, lat + label_offset_y))
             else:
                 # Override exists: apply dx/dy offset
-                target_x = lon + float(ov.get("dx", 0.0))
-                target_y = lat + float(ov.get("dy", 0.0))
+                label_positions.append((lon + float(ov.get("dx", 0.0)), lat + float(ov.get("dy", 0.0))))
 
-            # Don't clamp - let labels be positioned naturally, even if slightly outside bounds
-            # The map margins should be sufficient to keep labels visible
+        # Don't clamp - let labels be positioned naturally, even if slightly outside bounds
+        # The map margins should be sufficient to keep labels visible
 
-            label_font_pt = self._label_font_size_pt()
-            
-            # Użyj czcionki z fallbackiem na DejaVu Sans dla polskich znaków
-            # DejaVu Sans ma pełne wsparcie dla Unicode i polskich znaków diakrytycznych
+        # Bez render_labels (podgląd z nakładką JS) artyści etykiet nie są w ogóle tworzeni -
+        # metadane etykiet liczone są z samych pozycji
+        if render_labels:
             # Zawsze używaj DejaVu Sans dla etykiet miast, aby uniknąć problemów z polskimi znakami
-            font_family_with_fallback = "DejaVu Sans"
-            
-            text = ax.text(
-                target_x,
-                target_y,
-                city["name"],
-                ha="center",
-                va="bottom",
-                fontsize=label_font_pt,
-                fontfamily=font_family_with_fallback,
-                color=self.font_color,
-                fontweight='bold',
-                zorder=8,
-                clip_on=False,  # Don't clip labels - allow them to be visible
-                bbox=None,  # Wyłącz bbox - nie chcemy prostokątów przy etykietach
+            # (pełne wsparcie Unicode). Czcionka rozwiązywana raz dla wszystkich etykiet.
+            label_font = fm.FontProperties(
+                family="DejaVu Sans",
+                weight="bold",
+                size=self._label_font_pt,
             )
-            # Upewnij się, że nie ma żadnego tła ani ramki
-            text.set_bbox(None)
-            text.set_visible(render_labels)
-            texts.append(text)
+            for city, (target_x, target_y) in zip(unique_cities, label_positions):
+                ax.text(
+                    target_x,
+                    target_y,
+                    city["name"],
+                    ha="center",
+                    va="bottom",
+                    fontproperties=label_font,
+                    color=self.font_color,
+                    zorder=8,
+                    clip_on=False,  # Don't clip labels - allow them to be visible
+                    bbox=None,  # Wyłącz bbox - nie chcemy prostokątów przy etykietach
+                )
 
         # Jeśli potrzebujemy bardziej zaawansowanego układania podpisów, można
         # ponownie włączyć adjust_text, ale teraz zostawiamy podstawowy offset,
@@ -404,60 +610,63 @@ class MapGenerator:
         
         # Dostosuj zakres osi tak, by objąć całą trasę z marginesem
         if self.show_borders:
-            self._draw_country_borders(ax)
+            self._draw_country_borders(ax, (lon_min, lon_max, lat_min, lat_max), figsize)
 
         ax.set_xlim(lon_min, lon_max)
         ax.set_ylim(lat_min, lat_max)
         
         # Remove all margins so axes fill the entire figure BEFORE calculating bbox
         fig.subplots_adjust(left=0, right=1, top=1, bottom=0)
-        axes_left, axes_bottom, axes_width, axes_height = self._axes_box()
+        axes_left, axes_bottom, axes_width, axes_height = self._axes_rect
         ax.set_position([axes_left, axes_bottom, axes_width, axes_height])
         
         # Add poster texts (title and footers) if provided
         self._render_text_overlays(ax)
 
         # Build placed label metadata from current text positions (with overrides applied)
-        # Do this AFTER setting margins to zero so bbox is accurate
-        fig.canvas.draw()
-        renderer = fig.canvas.get_renderer()
+        # Do this AFTER setting margins to zero so bbox is accurate.
+        # No full canvas.draw() here - savefig renders the figure anyway; apply_aspect()
+        # resolves the final axes box for aspect='equal' without rasterizing anything.
+        ax.apply_aspect()
         fig_width_px, fig_height_px = fig.canvas.get_width_height()
         
         # Get axes bounding box in figure pixel coordinates
-        axes_bbox = ax.get_window_extent(renderer=renderer)
+        axes_bbox = ax.get_window_extent()
 
         lon_span = max(lon_max - lon_min, 1e-9)
         lat_span = max(lat_max - lat_min, 1e-9)
-        placed_labels = []
-        for text, city in zip(texts, unique_cities):
-            pos_x, pos_y = text.get_position()
-            # Convert data coordinates (lon/lat) to axes relative (0..1)
-            x_rel = float(np.clip((pos_x - lon_min) / lon_span, 0.0, 1.0))
-            y_rel = float(np.clip((pos_y - lat_min) / lat_span, 0.0, 1.0))
-            placed_labels.append({
+        positions = np.array(label_positions, dtype=float).reshape(-1, 2)
+        anchors = np.array(
+            [(city["longitude"], city["latitude"]) for city in unique_cities], dtype=float
+        ).reshape(-1, 2)
+        # Convert data coordinates (lon/lat) to axes relative (0..1)
+        rel = np.clip((positions - [lon_min, lat_min]) / [lon_span, lat_span], 0.0, 1.0)
+        deltas = positions - anchors
+        overrides = label_overrides or {}
+        placed_labels = [
+            {
                 "name": city["name"],
                 "x_rel": x_rel,
                 "y_rel": y_rel,
-                "anchor_lon": float(city["longitude"]),
-                "anchor_lat": float(city["latitude"]),
-                "locked": (label_overrides or {}).get(city["name"]) is not None,
-                "dx": float(pos_x - city["longitude"]),
-                "dy": float(pos_y - city["latitude"]),
-            })
+                "anchor_lon": anchor_lon,
+                "anchor_lat": anchor_lat,
+                "locked": overrides.get(city["name"]) is not None,
+                "dx": dx,
+                "dy": dy,
+            }
+            for city, (x_rel, y_rel), (anchor_lon, anchor_lat), (dx, dy) in zip(
+                unique_cities, rel.tolist(), anchors.tolist(), deltas.tolist()
+            )
+        ]
         
         signature_meta: Optional[Dict[str, Any]] = None
-        # Zapisz lub wyświetl
+        # Zapisz (bez output_file zwracane są tylko metadane)
         if output_file:
-            # Save without bbox_inches='tight' to avoid white margins
-            plt.savefig(output_file, dpi=self.dpi, pad_inches=0, facecolor=self.background_color, edgecolor='none')
-            signature_meta = self._apply_signature(output_file)
+            signature_meta = self._apply_signature(fig, output_file)
             print(f"Mapa zapisana do: {output_file}")
-        else:
-            plt.show()
-        
-        plt.close()
+        self._release_figure(fig)
  
-        label_font_px = float(self._label_font_size_pt() * self.dpi / 72.0)
+        label_font_px = float(self._label_font_pt * self.dpi / 72.0)
  
         map_info: Dict[str, Any] = {
             "labels": placed_labels,
@@ -482,7 +691,7 @@ class MapGenerator:
             "style": {
                 "font_family": self.font_family,
                 "font_color": self.font_color,
-                "label_font_size_pt": float(self._label_font_size_pt()),
+                "label_font_size_pt": float(self._label_font_pt),
                 "label_font_size_px": label_font_px,
                 "background_color": self.background_color,
             },
@@ -495,66 +704,79 @@ class MapGenerator:
 
         return map_info
 
-    def _label_font_size_pt(self) -> float:
-        # Dla pocztówek użyj mniejszej czcionki
-        if self.paper_format == "POSTCARD":
-            return 8.0  # Mniejsza czcionka dla pocztówek (10x15 cm)
-        return 11.0
+    def _acquire_figure(self, figsize: Tuple[float, float]) -> Tuple[Figure, Axes]:
+        key = (float(figsize[0]), float(figsize[1]), float(self.dpi))
+        with MapGenerator._FIGURE_LOCK:
+            fig = MapGenerator._FIGURE_POOL.pop(key, None)
+        if fig is None:
+            # layout="none" - osie mają stałe położenie z _axes_rect, więc silnik układu
+            # (figure.autolayout / constrained_layout z matplotlibrc) dodałby tylko dodatkowy przebieg
+            fig = Figure(figsize=figsize, dpi=self.dpi, layout="none")
+            FigureCanvasAgg(fig)
+            return fig, fig.subplots()
+        return fig, fig.axes[0]
 
-    def _margin_factor_lat(self, lat_span: float) -> float:
-        # Dla pocztówek zmniejsz marginesy geograficzne (większy zoom)
-        if self.paper_format == "POSTCARD":
-            return self.margin_factor * 0.5  # 50% mniejsze marginesy = większy zoom
-        return self.margin_factor
-
-    def _margin_factor_lon(self, lon_span: float) -> float:
-        # Dla pocztówek zmniejsz marginesy geograficzne (większy zoom)
-        if self.paper_format == "POSTCARD":
-            return self.margin_factor * 0.5  # 50% mniejsze marginesy = większy zoom
-        return self.margin_factor
- 
-    def _axes_box(self) -> Tuple[float, float, float, float]:
-        # Dla pocztówek zwiększ obszar mapy (zmniejsz marginesy wizualne)
-        if self.paper_format == "POSTCARD":
-            # Mapa zajmuje więcej miejsca - mniejsze marginesy wizualne
-            return (0.05, 0.10, 0.90, 0.80)  # Zwiększony obszar mapy
-        return (0.0, 0.0, 1.0, 1.0)
- 
-    def _apply_signature(self, output_file: str) -> Optional[Dict[str, Any]]:
+    @staticmethod
+    def _release_figure(fig: Figure) -> None:
+        # Osie zostają (z ukrytymi ramkami i bez ticków) - ich budowa to główny koszt nowej figury.
+        # Usuń tylko artystów tej mapy, żeby figura w puli nie trzymała trasy ani etykiet.
+        # Tytuł i stopki tylko ukrywamy - następna mapa zaktualizuje je przez _overlay_text
+        prefix = MapGenerator._OVERLAY_GID_PREFIX
+        for ax in fig.axes:
+            for artist in [*ax.collections, *ax.lines, *ax.patches, *ax.images]:
+                artist.remove()
+        for text in [*(text for ax in fig.axes for text in ax.texts), *fig.texts]:
+            if (text.get_gid() or "").startswith(prefix):
+                text.set_visible(False)
+            else:
+                text.remove()
+        width, height = fig.get_size_inches()
+        key = (float(width), float(height), float(fig.dpi))
+        with MapGenerator._FIGURE_LOCK:
+            if key in MapGenerator._FIGURE_POOL or len(MapGenerator._FIGURE_POOL) < MapGenerator._FIGURE_POOL_SIZE:
+                MapGenerator._FIGURE_POOL[key] = fig
+
+    def _apply_signature(self, fig: Figure, output_file: str) -> Optional[Dict[str, Any]]:
+        # Save without bbox_inches='tight' to avoid white margins - it also renders the figure
+        # a second time just to measure it. Passing the full-figure box explicitly keeps that
+        # true even when matplotlibrc sets savefig.bbox: tight
+        save_kwargs: Dict[str, Any] = {
+            "dpi": self.dpi,
+            "bbox_inches": fig.bbox_inches,
+            "pad_inches": 0,
+            "facecolor": self.background_color,
+            "edgecolor": "none",
+        }
         if not self.signature_enabled or not self.signature_path:
+            self._save_plain(fig, output_file, save_kwargs)
             return None
 
         sig_path = self.signature_path
         if not sig_path.exists():
+            self._save_plain(fig, output_file, save_kwargs)
             return {
                 "enabled": False,
                 "warning": f"Nie znaleziono pliku podpisu: {sig_path}",
             }
 
-        try:
-            base_image = Image.open(output_file).convert("RGBA")
-        except Exception as exc:  # pragma: no cover - ochronnie
-            return {
-                "enabled": False,
-                "warning": f"Nie udało się otworzyć pliku mapy do podpisu: {exc}",
-            }
-
         try:
             signature_image = Image.open(sig_path).convert("RGBA")
         except Exception as exc:  # pragma: no cover
-            base_image.close()
+            self._save_plain(fig, output_file, save_kwargs)
             return {
                 "enabled": False,
                 "warning": f"Nie udało się wczytać podpisu ({sig_path.name}): {exc}",
             }
 
-        base_width, base_height = base_image.size
+        pixels = self._render_rgba(fig, save_kwargs)
+
+        base_height, base_width = pixels.shape[:2]
         scale = self.signature_scale
         target_width = max(1, int(round(base_width * scale)))
         aspect_ratio = signature_image.height / signature_image.width if signature_image.width else 1.0
         target_height = max(1, int(round(target_width * aspect_ratio)))
 
-        resized_signature = signature_image.resize((target_width, target_height), Image.LANCZOS)
+        resized_signature = self._resized_signature(sig_path, signature_image, target_width, target_height)
         
         # Dla pozycji w rogu użyj minimalnego marginesu, aby podpis był w samym rogu
         corner_margin = 10  # Minimalny margines w pikselach dla rogów (10px)
@@ -589,11 +811,9 @@ class MapGenerator:
             offset_from_right = corner_margin_right + 50 if is_corner else margin_x + 50
             dest_x = base_width - target_width - offset_from_right if is_corner else base_width - target_width - offset_from_right
 
-        base_image.alpha_composite(resized_signature, dest=(dest_x, dest_y))
-        base_image.convert("RGB").save(output_file, format="PNG")
-
-        base_image.close()
         signature_image.close()
+        box = (dest_x, dest_y, dest_x + target_width, dest_y + target_height)
+        self._submit_save(pixels, output_file, resized_signature, box)
 
         return {
             "enabled": True,
@@ -608,6 +828,100 @@ class MapGenerator:
             },
         }
 
+    @staticmethod
+    def _render_rgba(fig: Figure, save_kwargs: Dict[str, Any]) -> np.ndarray:
+        # Render do surowego bufora RGBA zamiast PNG - bez dekodowania zapisanego pliku.
+        # Tablica (h, w, 4) to zapisywalny widok na bufor, bez kopii obrazu
+        raw = io.BytesIO()
+        fig.savefig(raw, format="rgba", **save_kwargs)
+        width, height = fig.canvas.get_width_height()
+        return np.frombuffer(raw.getbuffer(), dtype=np.uint8).reshape(height, width, 4)
+
+    def _save_plain(self, fig: Figure, output_file: str, save_kwargs: Dict[str, Any]) -> None:
+        if self.async_save:
+            self._submit_save(self._render_rgba(fig, save_kwargs), output_file)
+        else:
+            fig.savefig(output_file, **save_kwargs)
+
+    def _submit_save(
+        self,
+        pixels: np.ndarray,
+        output_file: str,
+        signature: Optional[Image.Image] = None,
+        box: Optional[Tuple[int, int, int, int]] = None,
+    ) -> None:
+        if self.async_save:
+            self._pending_saves.append(
+                self._SAVE_EXECUTOR.submit(self._encode_png, pixels, output_file, signature, box)
+            )
+        else:
+            self._encode_png(pixels, output_file, signature, box)
+
+    @staticmethod
+    def _encode_png(
+        pixels: np.ndarray,
+        output_file: str,
+        signature: Optional[Image.Image] = None,
+        box: Optional[Tuple[int, int, int, int]] = None,
+    ) -> None:
+        if signature is None or box is None:
+            Image.fromarray(pixels, "RGBA").save(output_file, format="PNG")
+            return
+        # Kompozycja tylko na wycinku pod podpisem, wynik wpisany z powrotem do bufora -
+        # reszta obrazu nie jest kopiowana ani konwertowana do RGB
+        left, top, right, bottom = box
+        region = Image.fromarray(pixels[top:bottom, left:right], "RGBA")
+        region.alpha_composite(signature)
+        pixels[top:bottom, left:right] = np.asarray(region)
+        # Jedno kodowanie PNG; compress_level=1 - wielokrotnie mniej CPU kosztem nieco większego pliku
+        Image.fromarray(pixels, "RGBA").save(output_file, format="PNG", compress_level=1)
+
+    def wait_for_saves(self) -> None:
+        """Czeka na zapisy uruchomione w tle (async_save) i zgłasza ich błędy."""
+        pending, self._pending_saves = self._pending_saves, []
+        for future in pending:
+            future.result()
+
+    def _resized_signature(
+        self,
+        sig_path: Path,
+        signature_image: Image.Image,
+        target_width: int,
+        target_height: int,
+    ) -> Image.Image:
+        key = (str(sig_path), sig_path.stat().st_mtime_ns, target_width, target_height)
+        cached = self._signature_cache.get(key)
+        if cached is not None:
+            return cached
+        # LANCZOS tylko przy silnym (ponad 2x) zmniejszeniu - przy zbliżonej skali BICUBIC wygląda tak samo
+        if target_width * 2 < signature_image.width:
+            resample = Image.LANCZOS
+        else:
+            resample = Image.BICUBIC
+        resized = signature_image.resize((target_width, target_height), resample)
+        self._signature_cache[key] = resized
+        return resized
+
+    @staticmethod
+    def _segment_multiplicity(names: List[str], merge_bidirectional: bool) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Dla każdego odcinka trasy zwraca numer jego przejazdu (0, 1, ...) i łączną liczbę przejazdów.
+
+        Przy merge_bidirectional odcinki A→B i B→A liczone są jako ten sam odcinek.
+        """
+        codes = np.unique(np.asarray(names, dtype=object), return_inverse=True)[1].reshape(-1)
+        pairs = np.column_stack([codes[:-1], codes[1:]])
+        if merge_bidirectional:
+            pairs.sort(axis=1)
+        _, inverse, counts = np.unique(pairs, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        # Stabilne sortowanie zachowuje kolejność przejazdów w obrębie grupy
+        order = np.argsort(inverse, kind="stable")
+        group_start = np.cumsum(counts) - counts
+        occurrence = np.empty_like(inverse)
+        occurrence[order] = np.arange(len(inverse)) - group_start[inverse[order]]
+        return occurrence, counts[inverse]
+
     def _build_curve(
         self,
         start: Tuple[float, float],
@@ -620,32 +934,50 @@ class MapGenerator:
         """
         start_vec = np.array(start, dtype=float)
         end_vec = np.array(end, dtype=float)
-        direction = end_vec - start_vec
-
-        if np.allclose(direction, 0):
+        if abs(end[0] - start[0]) <= 1e-8 and abs(end[1] - start[1]) <= 1e-8:
             return np.vstack([start_vec, end_vec])
+        return self._build_curves_batch(
+            start_vec[None, :], end_vec[None, :], [occurrence_idx], [total_occurrences]
+        )[0]
 
-        mid_point = (start_vec + end_vec) / 2.0
-        perpendicular = np.array([-direction[1], direction[0]], dtype=float)
-        norm = np.linalg.norm(perpendicular)
-        if norm != 0:
-            perpendicular /= norm
-        base_offset = self.curve_strength * np.linalg.norm(direction)
-        if total_occurrences > 1:
-            offset_step = 0.18 * base_offset
-            offset_multiplier = (
-                occurrence_idx - (total_occurrences - 1) / 2
-            )
-            base_offset += offset_multiplier * offset_step
-        control_point = mid_point + perpendicular * base_offset
-
-        t_values = np.linspace(0, 1, 50)
-        curve_points = (
-            (1 - t_values)[:, None] ** 2 * start_vec
-            + 2 * (1 - t_values)[:, None] * t_values[:, None] * control_point
-            + t_values[:, None] ** 2 * end_vec
-        )
-        return curve_points
+    def _build_curves_batch(
+        self,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        occurrence_idx: Any,
+        total_occurrences: Any,
+    ) -> np.ndarray:
+        """
+        Buduje krzywe Béziera drugiego stopnia dla wielu odcinków naraz.
+
+        Args:
+            starts, ends: Tablice (M, 2) z punktami początkowymi i końcowymi (lon, lat)
+            occurrence_idx: Numer przejazdu danym odcinkiem (M,)
+            total_occurrences: Liczba przejazdów danym odcinkiem (M,)
+
+        Returns:
+            Tablica (M, 50, 2) z punktami krzywych
+        """
+        starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+        direction = ends - starts
+        mid_points = (starts + ends) / 2.0
+
+        lengths = np.hypot(direction[:, 0], direction[:, 1])
+        perpendicular = np.column_stack([-direction[:, 1], direction[:, 0]])
+        # Wektor prostopadły ma tę samą długość co odcinek
+        np.divide(perpendicular, lengths[:, None], out=perpendicular, where=lengths[:, None] != 0)
+
+        occurrences = np.asarray(occurrence_idx, dtype=float)
+        totals = np.asarray(total_occurrences, dtype=float)
+        base_offset = self.curve_strength * lengths
+        # Wielokrotne przejazdy rozchylamy symetrycznie wokół podstawowego łuku
+        offset_multiplier = np.where(totals > 1, occurrences - (totals - 1) / 2, 0.0)
+        base_offset = base_offset + offset_multiplier * (0.18 * base_offset)
+        control_points = mid_points + perpendicular * base_offset[:, None]
+
+        # (50, 3) @ (M, 3, 2) -> (M, 50, 2): wszystkie krzywe jednym mnożeniem macierzy
+        return np.matmul(_BEZIER_BASIS, np.stack([starts, control_points, ends], axis=1))
 
     @staticmethod
     def _resolve_line_style(style: str) -> Tuple[str, Optional[str]]:
@@ -675,24 +1007,31 @@ class MapGenerator:
         # Zawsze zwracaj kółko jako domyślne, nawet jeśli styl nie jest rozpoznany
         return mapping.get(normalized, "o")
 
-    def _render_text_overlays(self, ax: plt.Axes) -> None:
+    def _render_text_overlays(self, ax: Axes) -> None:
         """Umieszcza napisy tytułu i podpisów dolnych."""
+        for spec in self._overlay_specs:
+            self._overlay_text(ax, spec.slot, spec.x, spec.y, spec.text, transform=ax.transAxes, **spec.props)
+
+    def _build_overlay_specs(self) -> List[_OverlaySpec]:
         font_family = self.text_font_family or self.font_family
         font_color = self.font_color
+        specs: List[_OverlaySpec] = []
 
         if self.title_text:
-            ax.text(
+            specs.append(_OverlaySpec(
+                "title",
                 0.5,
                 0.97,
                 self.title_text,
-                ha='center',
-                va='top',
-                fontsize=26,
-                fontfamily=font_family,
-                color=font_color,
-                fontweight='normal',
-                transform=ax.transAxes,
-            )
+                {
+                    "ha": 'center',
+                    "va": 'top',
+                    "fontsize": 26,
+                    "fontfamily": font_family,
+                    "color": font_color,
+                    "fontweight": 'normal',
+                },
+            ))
 
         # Dla pocztówek przesuń napisy bardziej na boki i niżej
         if self.paper_format == "POSTCARD":
@@ -705,34 +1044,16 @@ class MapGenerator:
             footer_y = 0.05
 
         footer_font_size = self.footer_font_size if self.footer_font_size is not None else 14
-        
-        if self.footer_left_text:
-            self._render_footer_text(
-                ax,
-                self.footer_left_text,
-                footer_x_left,
-                footer_y,
-                self._detect_footer_layout(self.footer_left_text),
-                'left',
-                font_family,
-                font_color,
-                footer_font_size,
-                ax.transAxes,
-            )
 
+        if self.footer_left_text:
+            specs.append(self._footer_spec(
+                self.footer_left_text, footer_x_left, footer_y, 'left', font_family, font_color, footer_font_size
+            ))
         if self.footer_right_text:
-            self._render_footer_text(
-                ax,
-                self.footer_right_text,
-                footer_x_right,
-                footer_y,
-                self._detect_footer_layout(self.footer_right_text),
-                'right',
-                font_family,
-                font_color,
-                footer_font_size,
-                ax.transAxes,
-            )
+            specs.append(self._footer_spec(
+                self.footer_right_text, footer_x_right, footer_y, 'right', font_family, font_color, footer_font_size
+            ))
+        return specs
 
     def _detect_footer_layout(self, text: Optional[str]) -> str:
         """Wykrywa układ stopki na podstawie zawartości tekstu. Enter = pionowy, spacja = poziomy."""
@@ -743,92 +1064,59 @@ class MapGenerator:
             return "vertical"
         return "horizontal"
 
-    def _render_footer_text(
+    def _footer_spec(
         self,
-        ax,
         text: str,
         x: float,
         y: float,
-        layout: str,
         ha: str,
         font_family: str,
         font_color: str,
         font_size: float,
-        transform=None,
-    ):
-        """Renderuje tekst stopki z obsługą układu poziomego i pionowego (dla ax.text)."""
-        if layout == "vertical":
-            # Dla układu pionowego, używamy jednego wywołania z linespacing dla lepszego formatowania
-            # Renderujemy cały tekst z parametrem linespacing dla lepszych odstępów między liniami
-            ax.text(
-                x,
-                y,
-                text,
-                ha=ha,
-                va='bottom',
-                fontsize=font_size,
-                fontfamily=font_family,
-                color=font_color,
-                fontweight='bold',
-                transform=transform or ax.transAxes,
-                linespacing=1.6,  # Zwiększa odstęp między liniami dla lepszej czytelności
-            )
-        else:
-            # Dla układu poziomego, renderujemy tekst normalnie
-            ax.text(
-                x,
-                y,
-                text,
-                ha=ha,
-                va='bottom',
-                fontsize=font_size,
-                fontfamily=font_family,
-                color=font_color,
-                fontweight='bold',
-                transform=transform or ax.transAxes,
-            )
+    ) -> _OverlaySpec:
+        """Stopka z obsługą układu poziomego i pionowego."""
+        layout = self._detect_footer_layout(text)
+        return _OverlaySpec(
+            f"footer_{ha}_{layout}",
+            x,
+            y,
+            text,
+            {
+                "ha": ha,
+                "va": 'bottom',
+                "fontsize": font_size,
+                "fontfamily": font_family,
+                "color": font_color,
+                "fontweight": 'bold',
+                **self._footer_layout_props(layout),
+            },
+        )
 
-    def _render_footer_text_fig(
-        self,
-        fig,
-        text: str,
-        x: float,
-        y: float,
-        layout: str,
-        ha: str,
-        font_family: str,
-        font_color: str,
-        font_size: float,
-    ):
-        """Renderuje tekst stopki z obsługą układu poziomego i pionowego (dla fig.text)."""
-        if layout == "vertical":
-            # Dla układu pionowego, używamy jednego wywołania z linespacing dla lepszego formatowania
-            # Renderujemy cały tekst z parametrem linespacing dla lepszych odstępów między liniami
-            fig.text(
-                x,
-                y,
-                text,
-                ha=ha,
-                va='bottom',
-                fontsize=font_size,
-                fontfamily=font_family,
-                color=font_color,
-                fontweight='bold',
-                linespacing=1.6,  # Zwiększa odstęp między liniami dla lepszej czytelności
-            )
-        else:
-            # Dla układu poziomego, renderujemy tekst normalnie
-            fig.text(
-                x,
-                y,
-                text,
-                ha=ha,
-                va='bottom',
-                fontsize=font_size,
-                fontfamily=font_family,
-                color=font_color,
-                fontweight='bold',
-            )
+    @staticmethod
+    def _footer_layout_props(layout: str) -> Dict[str, Any]:
+        # Układ pionowy: jeden tekst z większym odstępem między liniami dla lepszej czytelności.
+        # Poziomy zostaje przy domyślnej interlinii matplotlib - slot stopki zawiera układ,
+        # więc ponownie użyty artysta nie przenosi interlinii z drugiego układu
+        return {"linespacing": 1.6} if layout == "vertical" else {}
+
+    @staticmethod
+    def _overlay_text(parent: Any, slot: str, x: float, y: float, text: str, **props: Any) -> Text:
+        """
+        Tytuł lub stopka na osi albo figurze. Figura z puli zachowuje ukrytych artystów nakładek
+        (oznaczonych gid) - zamiast tworzyć nowy Text aktualizujemy istniejący.
+        Każdy slot dostaje zawsze ten sam zestaw właściwości, więc nic nie zostaje z poprzedniej mapy.
+        """
+        gid = MapGenerator._OVERLAY_GID_PREFIX + slot
+        for artist in parent.texts:
+            if artist.get_gid() == gid:
+                artist.set_position((x, y))
+                artist.set_text(text)
+                artist.update(props)
+                artist.set_visible(True)
+                return artist
+        artist = parent.text(x, y, text, **props)
+        artist.set_gid(gid)
+        return artist
 
     @staticmethod
     def _closest_point_on_segment(
@@ -838,14 +1126,15 @@ class MapGenerator:
     ) -> Tuple[np.ndarray, float]:
         """Zwraca punkt na odcinku najbliższy do zadanego punktu oraz odległość."""
         seg_vec = seg_end - seg_start
-        seg_len_sq = np.dot(seg_vec, seg_vec)
+        seg_len_sq = seg_vec[0] * seg_vec[0] + seg_vec[1] * seg_vec[1]
         if seg_len_sq == 0:
             projection = seg_start
         else:
-            t = np.dot(point - seg_start, seg_vec) / seg_len_sq
-            t = np.clip(t, 0.0, 1.0)
+            rel = point - seg_start
+            t = (rel[0] * seg_vec[0] + rel[1] * seg_vec[1]) / seg_len_sq
+            t = min(max(t, 0.0), 1.0)
             projection = seg_start + t * seg_vec
-        distance = np.linalg.norm(point - projection)
+        distance = _norm2(point - projection)
         return projection, distance
 
     @staticmethod
@@ -854,7 +1143,17 @@ class MapGenerator:
             return None
         dx = to_city["longitude"] - from_city["longitude"]
         dy = to_city["latitude"] - from_city["latitude"]
-        if np.allclose([dx, dy], 0.0):
+        return MapGenerator._cardinal_from_delta(dx, dy)
+
+    @staticmethod
+    def _cardinal_direction_idx(lonlat: np.ndarray, from_idx: int, to_idx: int) -> Optional[str]:
+        """Jak _cardinal_direction, ale na indeksach tablicy (N, 2) lon/lat zamiast słowników."""
+        dx, dy = lonlat[to_idx] - lonlat[from_idx]
+        return MapGenerator._cardinal_from_delta(float(dx), float(dy))
+
+    @staticmethod
+    def _cardinal_from_delta(dx: float, dy: float) -> Optional[str]:
+        if abs(dx) <= 1e-8 and abs(dy) <= 1e-8:
             return None
         if abs(dx) >= abs(dy):
             return "E" if dx > 0 else "W"
@@ -868,63 +1167,46 @@ class MapGenerator:
     ) -> np.ndarray:
         prev_dir = self._cardinal_direction(prev_city, current_city)
         next_dir = self._cardinal_direction(current_city, next_city)
+        # Zwracany wektor jest widokiem tylko do odczytu na stałą modułu
+        return _LABEL_DIR_TABLE[(prev_dir, next_dir)]
 
-        cardinal_vectors = {
-            "N": np.array([0.0, 1.0]),
-            "S": np.array([0.0, -1.0]),
-            "E": np.array([1.0, 0.0]),
-            "W": np.array([-1.0, 0.0]),
-        }
-
-        preferred_order = ["N", "E", "S", "W"]
-
-        def opposite(direction: str) -> str:
-            return {"N": "S", "S": "N", "E": "W", "W": "E"}[direction]
-
-        forbidden = set()
-        if prev_dir:
-            forbidden.add(prev_dir)
-        if next_dir:
-            forbidden.add(next_dir)
-        allowed = [d for d in preferred_order if d not in forbidden]
-
-        if prev_dir and next_dir:
-            opp_prev = opposite(prev_dir)
-            opp_next = opposite(next_dir)
-            priority = [opp_prev, opp_next] + allowed
-        elif prev_dir or next_dir:
-            base_dir = prev_dir or next_dir
-            priority = [opposite(base_dir)] + allowed
-        else:
-            priority = preferred_order
-
-        for direction in priority:
-            vec = cardinal_vectors.get(direction)
-            if vec is not None:
-                return vec
-
-        return np.array([0.0, 1.0])
+    @staticmethod
+    def _route_index(cities: List[Dict]) -> Tuple[Dict[str, List[int]], np.ndarray]:
+        """
+        Jednorazowe indeksy trasy: nazwa -> pozycje wystąpień oraz współrzędne (N, 2) lon/lat.
+        Pozwala sąsiadom miast korzystać z wycinków tablicy zamiast skanować listę słowników.
+        """
+        route = _Cities.from_route(cities)
+        name_to_indices: Dict[str, List[int]] = defaultdict(list)
+        for idx, name in enumerate(route.names):
+            name_to_indices[name].append(idx)
+        return name_to_indices, route.lonlat
 
-    def _get_neighbor_vectors(self, name: str, cities: List[Dict]) -> List[np.ndarray]:
-        indices = [idx for idx, city in enumerate(cities) if city["name"] == name]
+    def _get_neighbor_vectors(
+        self,
+        name: str,
+        cities: List[Dict],
+        route_index: Optional[Tuple[Dict[str, List[int]], np.ndarray]] = None,
+    ) -> List[np.ndarray]:
+        name_to_indices, coords = route_index or self._route_index(cities)
+        indices = name_to_indices.get(name)
         if not indices:
             return []
 
         idx = indices[0]
-        current = np.array([cities[idx]["longitude"], cities[idx]["latitude"]], dtype=float)
         vectors: List[np.ndarray] = []
 
         if idx > 0:
-            prev = np.array([cities[idx - 1]["longitude"], cities[idx - 1]["latitude"]], dtype=float)
-            vec = current - prev
-            if np.linalg.norm(vec) > 0:
-                vectors.append(vec / np.linalg.norm(vec))
+            vec = coords[idx] - coords[idx - 1]
+            length = _norm2(vec)
+            if length > 0:
+                vectors.append(vec / length)
 
-        if idx < len(cities) - 1:
-            nxt = np.array([cities[idx + 1]["longitude"], cities[idx + 1]["latitude"]], dtype=float)
-            vec = nxt - current
-            if np.linalg.norm(vec) > 0:
-                vectors.append(vec / np.linalg.norm(vec))
+        if idx < len(coords) - 1:
+            vec = coords[idx + 1] - coords[idx]
+            length = _norm2(vec)
+            if length > 0:
+                vectors.append(vec / length)
 
         return vectors
 
@@ -937,14 +1219,22 @@ class MapGenerator:
         for vec in neighbour_vectors:
             direction += -vec
 
-        if np.linalg.norm(direction) == 0:
+        length = _norm2(direction)
+        if length == 0:
             return np.array([0.0, 1.0])
-        return direction / np.linalg.norm(direction)
+        return direction / length
 
     @staticmethod
-    def _get_neighbors(name: str, cities: List[Dict]) -> Tuple[Optional[Dict], Optional[Dict]]:
+    def _get_neighbors(
+        name: str,
+        cities: List[Dict],
+        name_to_indices: Optional[Dict[str, List[int]]] = None,
+    ) -> Tuple[Optional[Dict], Optional[Dict]]:
         """Zwraca poprzednie i następne wystąpienie miasta w trasie."""
-        indices = [idx for idx, city in enumerate(cities) if city["name"] == name]
+        if name_to_indices is not None:
+            indices = name_to_indices.get(name)
+        else:
+            indices = [idx for idx, city in enumerate(cities) if city["name"] == name]
         if not indices:
             return None, None
 
@@ -963,7 +1253,12 @@ class MapGenerator:
 
         return prev_city, next_city
 
-    def _draw_country_borders(self, ax: plt.Axes) -> None:
+    def _draw_country_borders(
+        self,
+        ax: Axes,
+        extent: Tuple[float, float, float, float],
+        figsize: Tuple[float, float],
+    ) -> None:
         """
         Rysuje granice państw jako delikatne kontury.
         """
@@ -976,8 +1271,36 @@ class MapGenerator:
                 )
             return
 
-        collection = PolyCollection(
-            shapes,
+        lon_min, lon_max, lat_min, lat_max = extent
+        # Pomijamy kontury całkowicie poza widokiem (z zapasem na pogrubione krawędzie)
+        pad_lon = (lon_max - lon_min) * 0.05
+        pad_lat = (lat_max - lat_min) * 0.05
+        visible: List[np.ndarray] = []
+        for shape in shapes:
+            mins = shape.min(axis=0)
+            maxs = shape.max(axis=0)
+            if (
+                maxs[0] >= lon_min - pad_lon
+                and mins[0] <= lon_max + pad_lon
+                and maxs[1] >= lat_min - pad_lat
+                and mins[1] <= lat_max + pad_lat
+            ):
+                visible.append(shape)
+
+        if self.border_simplify_px > 0:
+            # Stopnie na piksel wyjściowy - oś zajmuje co najwyżej całą figurę, więc to dolne oszacowanie
+            deg_per_px = min(
+                (lon_max - lon_min) / (figsize[0] * self.dpi),
+                (lat_max - lat_min) / (figsize[1] * self.dpi),
+            )
+            tolerance = deg_per_px * self.border_simplify_px
+            simplified = (_simplify_ring(shape, tolerance) for shape in visible)
+            visible = [shape for shape in simplified if len(shape) >= 3]
+        if not visible:
+            return
+
+        collection = PathCollection(
+            [self._ring_path(shape) for shape in visible],
             facecolor='none',
             edgecolor=self.border_edgecolor,
             linewidth=self.border_linewidth,
@@ -986,6 +1309,20 @@ class MapGenerator:
         )
         ax.add_collection(collection)
 
+    @staticmethod
+    def _ring_path(ring: np.ndarray) -> MplPath:
+        """
+        Zamknięty kontur jako Path bez kopiowania wierzchołków. Pierścienie GeoJSON są
+        domknięte (ostatni punkt = pierwszy), więc ostatni wierzchołek niesie CLOSEPOLY -
+        PolyCollection(closed=True) doklejałaby do każdego pierścienia kopię pierwszego punktu.
+        """
+        if not (ring[0] == ring[-1]).all():
+            ring = np.concatenate([ring, ring[:1]])
+        codes = np.full(len(ring), MplPath.LINETO, dtype=MplPath.code_type)
+        codes[0] = MplPath.MOVETO
+        codes[-1] = MplPath.CLOSEPOLY
+        return MplPath(ring, codes)
+
     def _get_border_shapes(self) -> List[np.ndarray]:
         """
         Pobiera i buforuje współrzędne granic państw z Natural Earth.
@@ -993,58 +1330,126 @@ class MapGenerator:
         if self._border_shapes_cache is not None:
             return self._border_shapes_cache
 
-        url = (
-            "https://raw.githubusercontent.com/nvkelso/"
-            "natural-earth-vector/master/geojson/"
-            "ne_110m_admin_0_countries.geojson"
-        )
+        with MapGenerator._BORDER_LOCK:
+            shapes = MapGenerator._BORDER_SHAPES_CACHE
+            if shapes is None and self._cache_is_fresh(BORDERS_CACHE_PATH):
+                shapes = self._read_border_cache()
+            if shapes is None:
+                try:
+                    shapes = self._load_border_shapes()
+                except Exception as exc:
+                    # Nieaktualny bufor jest lepszy niż mapa bez granic
+                    shapes = self._read_border_cache()
+                    if shapes is None:
+                        # Błąd zapamiętujemy tylko w tej instancji - kolejna spróbuje pobrać ponownie
+                        self._border_error = exc
+                        self._border_shapes_cache = []
+                        return []
+                else:
+                    self._write_border_cache(shapes)
+            MapGenerator._BORDER_SHAPES_CACHE = shapes
+
+        self._border_shapes_cache = shapes
+        return shapes
+
+    def _load_border_shapes(self) -> List[np.ndarray]:
+        loads = orjson.loads if _ORJSON_AVAILABLE else json.loads
+        data = None
+        if self._cache_is_fresh(BORDERS_GEOJSON_PATH):
+            try:
+                data = loads(BORDERS_GEOJSON_PATH.read_bytes())
+            except (OSError, ValueError):
+                data = None
+        if data is None:
+            data = loads(self._fetch_borders_geojson())
+
+        # Pierwsze przejście: zewnętrzne pierścienie poligonów i ich długości
+        rings: List[List[List[float]]] = []
+        for feature in data.get("features", []):
+            geometry = feature.get("geometry")
+            if not geometry:
+                continue
+            geom_type = geometry.get("type")
+            coords = geometry.get("coordinates")
+            if not coords:
+                continue
+            if geom_type == "Polygon":
+                polygons = [coords]
+            elif geom_type == "MultiPolygon":
+                polygons = coords
+            else:
+                continue
+            for polygon in polygons:
+                if polygon and polygon[0] and len(polygon[0][0]) == 2:
+                    rings.append(polygon[0])
+
+        # Drugie przejście: jedna tablica punktów zamiast osobnego np.array na każdy pierścień
+        offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+        np.cumsum([len(ring) for ring in rings], out=offsets[1:])
+        points = np.empty((int(offsets[-1]), 2), dtype=np.float32)
+        for ring, start, stop in zip(rings, offsets[:-1], offsets[1:]):
+            points[start:stop] = ring
+        return np.split(points, offsets[1:-1]) if rings else []
+
+    @staticmethod
+    def _fetch_borders_geojson() -> bytes:
+        # Import tylko przy faktycznym pobieraniu - bez show_borders moduł nie płaci za klienta HTTP
+        import ssl
+        import urllib.request
+
+        import certifi
 
+        context = ssl.create_default_context(cafile=certifi.where())
+        with urllib.request.urlopen(BORDERS_URL, timeout=15, context=context) as response:
+            raw = response.read()
         try:
-            response = requests.get(url, timeout=15)
-            response.raise_for_status()
-            data = response.json()
-
-            shapes: List[np.ndarray] = []
-            for feature in data.get("features", []):
-                geometry = feature.get("geometry")
-                if not geometry:
-                    continue
-                geom_type = geometry.get("type")
-                coords = geometry.get("coordinates")
-                if not coords:
-                    continue
-                if geom_type == "Polygon":
-                    shapes.extend(self._polygon_to_paths(coords))
-                elif geom_type == "MultiPolygon":
-                    for polygon in coords:
-                        shapes.extend(self._polygon_to_paths(polygon))
-
-            self._border_shapes_cache = shapes
-            return shapes
-
-        except Exception as exc:
-            self._border_error = exc
-            self._border_shapes_cache = []
-            return []
+            BORDERS_GEOJSON_PATH.parent.mkdir(parents=True, exist_ok=True)
+            BORDERS_GEOJSON_PATH.write_bytes(raw)
+        except OSError as exc:
+            print(f"⚠ Nie udało się zapisać granic państw do {BORDERS_GEOJSON_PATH}: {exc}")
+        return raw
 
     @staticmethod
-    def _polygon_to_paths(rings: List[List[List[float]]]) -> List[np.ndarray]:
-        """
-        Konwertuje współrzędne pierścieni poligonu GeoJSON na tablice NumPy.
-        """
-        if not rings:
-            return []
-        outer_ring = np.array(rings[0], dtype=float)
-        if outer_ring.ndim != 2 or outer_ring.shape[1] != 2:
-            return []
-        return [outer_ring]
+    def _cache_is_fresh(path: Path) -> bool:
+        try:
+            return time.time() - path.stat().st_mtime < BORDERS_CACHE_MAX_AGE
+        except OSError:
+            return False
+
+    @staticmethod
+    def _read_border_cache() -> Optional[List[np.ndarray]]:
+        if not BORDERS_CACHE_PATH.exists():
+            return None
+        try:
+            with np.load(BORDERS_CACHE_PATH) as data:
+                # Bufory zapisane przed przejściem na float32 też trzymamy w pamięci jako float32
+                points = data["points"].astype(np.float32, copy=False)
+                offsets = data["offsets"]
+        except Exception:
+            return None
+        # Wszystkie kontury to widoki jednej tablicy punktów
+        return np.split(points, offsets) if len(points) else []
+
+    @staticmethod
+    def _write_border_cache(shapes: List[np.ndarray]) -> None:
+        # float32 wystarcza dla stopni geograficznych i o połowę zmniejsza plik
+        points = np.concatenate(shapes).astype(np.float32, copy=False) if shapes else np.empty((0, 2), dtype=np.float32)
+        offsets = np.cumsum([len(shape) for shape in shapes[:-1]], dtype=np.int64)
+        try:
+            BORDERS_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = BORDERS_CACHE_PATH.with_suffix(".tmp")
+            with open(tmp_path, "wb") as handle:
+                np.savez_compressed(handle, points=points, offsets=offsets)
+            os.replace(tmp_path, BORDERS_CACHE_PATH)
+        except OSError as exc:
+            print(f"⚠ Nie udało się zapisać granic państw do {BORDERS_CACHE_PATH}: {exc}")
 
     def _place_labels_with_collision_avoidance(
         self,
-        texts: List[plt.Text],
+        texts: List[Text],
         unique_cities: List[Dict],
         route_cities: List[Dict],
-        ax: plt.Axes,
+        ax: Axes,
         min_line_distance_px: float = 32.0,
         min_label_distance_px: float = 30.0,
         max_iterations: int = 180,
@@ -1056,261 +1461,233 @@ class MapGenerator:
 
         overrides = label_overrides or {}
 
-        figure = ax.figure
-        canvas = figure.canvas
-        if not hasattr(canvas, "get_renderer"):
-            canvas.draw()
-        renderer = canvas.get_renderer()
-
-        segments = [
-            (
-                np.array([route_cities[i]["longitude"], route_cities[i]["latitude"]], dtype=float),
-                np.array([route_cities[i + 1]["longitude"], route_cities[i + 1]["latitude"]], dtype=float),
-            )
-            for i in range(len(route_cities) - 1)
-        ] if len(route_cities) > 1 else []
+        # Do pomiaru tekstu wystarczy renderer 1×1 px w dpi figury - metryki czcionek nie zależą
+        # od rozmiaru płótna, a renderer canvasu alokowałby bufor całego plakatu
+        renderer = RendererAgg(1, 1, ax.figure.dpi)
 
-        def data_to_px(point: np.ndarray) -> np.ndarray:
-            return ax.transData.transform(point)
+        if ax.transData.is_affine:
+            # Przy liniowych osiach transData to stała macierz afiniczna - pobierz ją raz
+            # i przeliczaj punkty NumPy zamiast przez łańcuch transformacji matplotlib
+            matrix = ax.transData.get_matrix()
+            linear = matrix[:2, :2]
+            offset = matrix[:2, 2]
+            inverse = np.linalg.inv(linear)
 
-        def px_to_data(point_px: np.ndarray) -> np.ndarray:
-            return ax.transData.inverted().transform(point_px)
+            def data_to_px(points: np.ndarray) -> np.ndarray:
+                return points @ linear.T + offset
 
-        label_entries: List[Dict] = []
-        for text, city in zip(texts, unique_cities):
-            anchor = np.array([city["longitude"], city["latitude"]], dtype=float)
+            def px_to_data(points_px: np.ndarray) -> np.ndarray:
+                return (points_px - offset) @ inverse.T
+        else:
+            def data_to_px(points: np.ndarray) -> np.ndarray:
+                return ax.transData.transform(points)
+
+            def px_to_data(points_px: np.ndarray) -> np.ndarray:
+                return ax.transData.inverted().transform(points_px)
+
+        # Odcinki trasy w pikselach jako tablice (M, 2) - jedna transformacja zamiast M×iteracje
+        route_coords = np.array(
+            [(city["longitude"], city["latitude"]) for city in route_cities], dtype=float
+        ).reshape(-1, 2)
+        route_px = data_to_px(route_coords) if len(route_coords) else route_coords
+        seg_start_px = np.ascontiguousarray(route_px[:-1])
+        seg_end_px = np.ascontiguousarray(route_px[1:])
+
+        # Etykiety jako tablice (N, 2) / (N,)
+        count = min(len(texts), len(unique_cities))
+        anchors_data = np.empty((count, 2), dtype=float)
+        positions_data = np.empty((count, 2), dtype=float)
+        locked = np.zeros(count, dtype=bool)
+        for idx, (text, city) in enumerate(zip(texts, unique_cities)):
+            anchors_data[idx] = (city["longitude"], city["latitude"])
             override = overrides.get(city["name"])
             if override:
-                position_data = np.array([
-                    anchor[0] + override.get("dx", 0.0),
-                    anchor[1] + override.get("dy", 0.0),
-                ], dtype=float)
-                locked = True
+                positions_data[idx] = (
+                    anchors_data[idx, 0] + override.get("dx", 0.0),
+                    anchors_data[idx, 1] + override.get("dy", 0.0),
+                )
+                locked[idx] = True
             else:
-                position_data = np.array(text.get_position(), dtype=float)
-                locked = False
-
-            anchor_px = data_to_px(anchor)
-            position_px = data_to_px(position_data)
-            bbox = text.get_window_extent(renderer=renderer)
-            label_entries.append({
-                "text": text,
-                "anchor_data": anchor,
-                "anchor_px": anchor_px,
-                "position_px": position_px,
-                "half_width_px": max(bbox.width / 2.0, 20.0),
-                "half_height_px": max(bbox.height / 2.0, 12.0),
-                "locked": locked,
-            })
-
-        def label_bbox(entry: Dict) -> Tuple[float, float, float, float]:
-            center = entry["position_px"]
-            return (
-                center[0] - entry["half_width_px"],
-                center[0] + entry["half_width_px"],
-                center[1] - entry["half_height_px"],
-                center[1] + entry["half_height_px"],
-            )
-
-        for _ in range(max_iterations):
-            moved = False
-            for entry in label_entries:
-                if entry.get("locked"):
-                    continue
-
-                pos_px = entry["position_px"]
-                shift = np.zeros(2, dtype=float)
-
-                for seg_start, seg_end in segments:
-                    start_px = data_to_px(seg_start)
-                    end_px = data_to_px(seg_end)
-                    projection, distance = self._closest_point_on_segment_px(pos_px, start_px, end_px)
-                    if distance < min_line_distance_px:
-                        direction = pos_px - projection
-                        if np.allclose(direction, 0.0):
-                            seg_vec = end_px - start_px
-                            direction = np.array([-seg_vec[1], seg_vec[0]], dtype=float)
-                        if np.allclose(direction, 0.0):
-                            direction = np.array([0.0, 1.0])
-                        direction /= np.linalg.norm(direction)
-                        shift += direction * (min_line_distance_px - distance + 1.0)
-
-                entry_box = label_bbox(entry)
-                for other in label_entries:
-                    if other is entry:
-                        continue
-                    other_box = label_bbox(other)
-                    if self._boxes_overlap(entry_box, other_box, padding=min_label_distance_px):
-                        delta = pos_px - other["position_px"]
-                        if np.allclose(delta, 0.0):
-                            delta = np.array([0.0, 1.0])
-                        delta /= np.linalg.norm(delta)
-                        shift += delta * (min_label_distance_px / 2)
-
-                shift += (pos_px - entry["anchor_px"]) * -0.03
-
-                if np.linalg.norm(shift) > 0.4:
-                    new_pos = pos_px + shift
-                    if np.linalg.norm(new_pos - entry["anchor_px"]) > max_anchor_distance_px:
-                        new_pos = entry["anchor_px"] + (new_pos - entry["anchor_px"]) * (
-                            max_anchor_distance_px / np.linalg.norm(new_pos - entry["anchor_px"])
-                        )
-                    entry["position_px"] = new_pos
-                    moved = True
-
-            if not moved:
-                break
-
-        for entry in label_entries:
-            if entry.get("locked"):
-                entry["final_position_data"] = px_to_data(entry["position_px"])
-                continue
-            pos_data = px_to_data(entry["position_px"])
-            entry["text"].set_position(pos_data)
-            entry["final_position_data"] = pos_data
+                positions_data[idx] = text.get_position()
+        half_w, half_h = self._measure_labels(texts[:count], renderer)
+
+        anchors_px = data_to_px(anchors_data)
+        positions_px = data_to_px(positions_data)
+        positions_px = _solve_label_positions_numpy(
+            positions_px,
+            anchors_px,
+            half_w,
+            half_h,
+            seg_start_px,
+            seg_end_px,
+            locked,
+            float(min_line_distance_px),
+            float(min_label_distance_px),
+            float(max_anchor_distance_px),
+            int(max_iterations),
+        )
 
+        final_positions_data = px_to_data(positions_px)
         result: List[Dict[str, Any]] = []
-        for entry, city in zip(label_entries, unique_cities):
+        for idx, text in enumerate(texts[:count]):
+            if not locked[idx]:
+                text.set_position(final_positions_data[idx])
             result.append({
-                "name": entry["text"].get_text(),
-                "anchor_data": entry["anchor_data"],
-                "position_data": entry["final_position_data"],
-                "anchor_px": entry["anchor_px"],
-                "position_px": entry["position_px"],
-                "locked": entry.get("locked", False),
+                "name": text.get_text(),
+                "anchor_data": anchors_data[idx],
+                "position_data": final_positions_data[idx],
+                "anchor_px": anchors_px[idx],
+                "position_px": positions_px[idx],
+                "locked": bool(locked[idx]),
             })
 
         return result
 
     @staticmethod
-    def _closest_point_on_segment_px(
-        point_px: np.ndarray,
-        seg_start_px: np.ndarray,
-        seg_end_px: np.ndarray,
-    ) -> Tuple[np.ndarray, float]:
-        seg_vec = seg_end_px - seg_start_px
-        seg_len_sq = np.dot(seg_vec, seg_vec)
-        if seg_len_sq == 0:
-            projection = seg_start_px
-        else:
-            t = np.dot(point_px - seg_start_px, seg_vec) / seg_len_sq
-            t = np.clip(t, 0.0, 1.0)
-            projection = seg_start_px + t * seg_vec
-        distance = np.linalg.norm(point_px - projection)
-        return projection, distance
-
-    @staticmethod
-    def _boxes_overlap(
-        box_a: Tuple[float, float, float, float],
-        box_b: Tuple[float, float, float, float],
-        padding: float,
-    ) -> bool:
-        ax0, ax1, ay0, ay1 = box_a
-        bx0, bx1, by0, by1 = box_b
-        return not (
-            ax1 + padding < bx0 - padding
-            or ax0 - padding > bx1 + padding
-            or ay1 + padding < by0 - padding
-            or ay0 - padding > by1 + padding
-        )
-
-
-
-
-class PosterMapGenerator(MapGenerator):
-    FORMAT_ID = "POSTER_50X70"
-    LABEL_FONT_PT = 28.0
-    TITLE_FONT_PT = 112.0
-    FOOTER_FONT_PT = 36.0
+    def _measure_labels(texts: List[Text], renderer: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Mierzy połowy szerokości i wysokości etykiet w pikselach - jedyny moment, w którym
+        solver pyta renderer o rozmiar tekstu (przesunięcie nie zmienia wymiarów).
+        """
+        cache = MapGenerator._TEXT_EXTENT_CACHE
+        half_w = np.empty(len(texts), dtype=float)
+        half_h = np.empty(len(texts), dtype=float)
+        for idx, text in enumerate(texts):
+            # Rozmiar zależy od treści, czcionki, obrotu i interlinii - nie od położenia
+            font = text.get_fontproperties()
+            key = (
+                text.get_text(),
+                tuple(font.get_family()),
+                font.get_style(),
+                font.get_variant(),
+                font.get_weight(),
+                font.get_stretch(),
+                font.get_size_in_points(),
+                font.get_file(),
+                text.get_rotation(),
+                text.get_linespacing(),
+                text.get_usetex(),
+                text.figure.dpi,
+            )
+            extent = cache.get(key)
+            if extent is None:
+                bbox = text.get_window_extent(renderer=renderer)
+                extent = (bbox.width, bbox.height)
+                if len(cache) >= MapGenerator._TEXT_EXTENT_CACHE_SIZE:
+                    cache.clear()
+                cache[key] = extent
+            half_w[idx] = max(extent[0] / 2.0, 20.0)
+            half_h[idx] = max(extent[1] / 2.0, 12.0)
+        return half_w, half_h
+
+
+class _PosterMapGenerator(MapGenerator):
+    """
+    Wspólna logika plakatów - podklasy deklarują tylko stałe klasowe formatu i układu.
+    """
+    FORMAT_ID: ClassVar[str]
+    LABEL_FONT_PT: ClassVar[float]
+    TITLE_FONT_PT: ClassVar[float]
+    FOOTER_FONT_PT: ClassVar[float]
+    # Wymiary i opis używane, gdy format nie jest zdefiniowany w PAPER_FORMATS
+    DEFAULT_SIZE_MM: ClassVar[Tuple[float, float]]
+    DEFAULT_LABEL: ClassVar[str]
+    # Specyfikacja FORMAT_ID rozwiązywana raz, przy definicji podklasy
+    PAPER_SPEC: ClassVar[PaperSpec]
+    # Stałe rozmiary czcionek dopisywane do map_info["style"], budowane raz na podklasę
+    _STYLE_DEFAULTS: ClassVar[MappingProxyType]
+    ORIENTATION: ClassVar[str]
+    # Domyślne argumenty MapGenerator specyficzne dla formatu
+    DEFAULT_KWARGS: ClassVar[Dict[str, Any]]
+    # Marginesy plakatu (pionowy, poziomy) jako ułamek rozpiętości trasy
+    POSTER_MARGINS: ClassVar[Tuple[float, float]]
+    # Położenia w ułamkach figury: (left, bottom, width, height) osi oraz punkty zaczepienia tekstów
+    AXES_BOX: ClassVar[Tuple[float, float, float, float]]
+    TITLE_XY: ClassVar[Tuple[float, float]]
+    FOOTER_LEFT_XY: ClassVar[Tuple[float, float]]
+    FOOTER_RIGHT_XY: ClassVar[Tuple[float, float]]
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         kwargs = dict(kwargs)
-        spec = self.PAPER_FORMATS.get(self.FORMAT_ID, {})
-        width_mm = float(spec.get("width_mm", 500.0))
-        height_mm = float(spec.get("height_mm", 700.0))
+        width_mm, height_mm = self._paper_size_mm()
         width_in = width_mm / self.MM_PER_INCH
         height_in = height_mm / self.MM_PER_INCH
         kwargs.setdefault("figsize", (width_in, height_in))
         kwargs.setdefault("paper_format", self.FORMAT_ID)
         kwargs.setdefault("min_margin_deg", 0.03)
-        kwargs.setdefault("max_margin_factor", 0.06)
-        kwargs.setdefault("curve_strength", 0.32)
+        for key, value in self.DEFAULT_KWARGS.items():
+            kwargs.setdefault(key, value)
         kwargs.setdefault("lock_paper_orientation", True)
         super().__init__(*args, **kwargs)
-        self.poster_margin_vertical = 0.05
-        self.poster_margin_horizontal = 0.08
+        self.poster_margin_vertical, self.poster_margin_horizontal = self.POSTER_MARGINS
+        self._margin_factor_lat = self.poster_margin_vertical
+        self._margin_factor_lon = self.poster_margin_horizontal
+        self._label_font_pt = self.LABEL_FONT_PT
+        self._axes_rect = self.AXES_BOX
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        try:
+            cls.PAPER_SPEC = MapGenerator.PAPER_FORMATS[cls.FORMAT_ID]
+        except KeyError:
+            cls.PAPER_SPEC = PaperSpec(*cls.DEFAULT_SIZE_MM, cls.DEFAULT_LABEL)
+        cls._STYLE_DEFAULTS = MappingProxyType({
+            "title_font_size_pt": cls.TITLE_FONT_PT,
+            "footer_font_size_pt": cls.FOOTER_FONT_PT,
+        })
 
-    def _label_font_size_pt(self) -> float:
-        return self.LABEL_FONT_PT
+    @classmethod
+    def _paper_size_mm(cls) -> Tuple[float, float]:
+        return cls.PAPER_SPEC.width_mm, cls.PAPER_SPEC.height_mm
 
     @classmethod
     def paper_metadata(cls, dpi: int) -> Dict[str, Any]:
-        spec = MapGenerator.PAPER_FORMATS.get(cls.FORMAT_ID, {})
-        width_mm = float(spec.get("width_mm", 500.0))
-        height_mm = float(spec.get("height_mm", 700.0))
+        spec = cls.PAPER_SPEC
         return {
             "format": cls.FORMAT_ID,
-            "label": spec.get("label", "Plakat 50 × 70 cm"),
-            "orientation": "portrait",
+            "label": spec.label,
+            "orientation": cls.ORIENTATION,
             "dpi": int(dpi),
-            "width_mm": width_mm,
-            "height_mm": height_mm,
+            "width_mm": spec.width_mm,
+            "height_mm": spec.height_mm,
         }
 
-    def _margin_factor_lat(self, lat_span: float) -> float:
-        return self.poster_margin_vertical
-
-    def _margin_factor_lon(self, lon_span: float) -> float:
-        return self.poster_margin_horizontal
-
-    def _axes_box(self) -> Tuple[float, float, float, float]:
-        return (0.08, 0.17, 0.84, 0.66)
-
-    def _render_text_overlays(self, ax: plt.Axes) -> None:
+    def _render_text_overlays(self, ax: Axes) -> None:
         fig = ax.figure
+        for spec in self._overlay_specs:
+            self._overlay_text(fig, spec.slot, spec.x, spec.y, spec.text, **spec.props)
+
+    def _build_overlay_specs(self) -> List[_OverlaySpec]:
         font_family = self.text_font_family or self.font_family
         font_color = self.font_color
+        specs: List[_OverlaySpec] = []
 
         if self.title_text:
-            fig.text(
-                0.5,
-                0.965,
+            specs.append(_OverlaySpec(
+                "title",
+                *self.TITLE_XY,
                 self.title_text,
-                ha='center',
-                va='top',
-                fontsize=self.TITLE_FONT_PT,
-                fontfamily=font_family,
-                color=font_color,
-                fontweight='normal',
-            )
+                {
+                    "ha": 'center',
+                    "va": 'top',
+                    "fontsize": self.TITLE_FONT_PT,
+                    "fontfamily": font_family,
+                    "color": font_color,
+                    "fontweight": 'normal',
+                },
+            ))
 
         footer_font_size = self.footer_font_size if self.footer_font_size is not None else self.FOOTER_FONT_PT
 
         if self.footer_left_text:
-            self._render_footer_text_fig(
-                fig,
-                self.footer_left_text,
-                0.08,
-                0.06,
-                self._detect_footer_layout(self.footer_left_text),
-                'left',
-                font_family,
-                font_color,
-                footer_font_size,
-            )
-
+            specs.append(self._footer_spec(
+                self.footer_left_text, *self.FOOTER_LEFT_XY, 'left', font_family, font_color, footer_font_size
+            ))
         if self.footer_right_text:
-            self._render_footer_text_fig(
-                fig,
-                self.footer_right_text,
-                0.92,
-                0.06,
-                self._detect_footer_layout(self.footer_right_text),
-                'right',
-                font_family,
-                font_color,
-                footer_font_size,
-            )
+            specs.append(self._footer_spec(
+                self.footer_right_text, *self.FOOTER_RIGHT_XY, 'right', font_family, font_color, footer_font_size
+            ))
+        return specs
 
     def generate_map(
         self,
@@ -1327,357 +1704,69 @@ class PosterMapGenerator(MapGenerator):
             render_labels=render_labels,
             hidden_labels=hidden_labels,
         )
-        style = map_info.setdefault("style", {})
-        style["title_font_size_pt"] = self.TITLE_FONT_PT
-        style["footer_font_size_pt"] = self.FOOTER_FONT_PT
+        map_info.setdefault("style", {}).update(self._STYLE_DEFAULTS)
         return map_info
 
 
-
-
-class LandscapePosterMapGenerator(MapGenerator):
-    FORMAT_ID = "POSTER_70X50"
+class PosterMapGenerator(_PosterMapGenerator):
+    FORMAT_ID = POSTER_50X70
+    LABEL_FONT_PT = 28.0
+    TITLE_FONT_PT = 112.0
+    FOOTER_FONT_PT = 36.0
+    DEFAULT_SIZE_MM = (500.0, 700.0)
+    DEFAULT_LABEL = "Plakat 50 × 70 cm"
+    ORIENTATION = "portrait"
+    DEFAULT_KWARGS = {"max_margin_factor": 0.06, "curve_strength": 0.32}
+    POSTER_MARGINS = (0.05, 0.08)
+    AXES_BOX = (0.08, 0.17, 0.84, 0.66)
+    TITLE_XY = (0.5, 0.965)
+    FOOTER_LEFT_XY = (0.08, 0.06)
+    FOOTER_RIGHT_XY = (0.92, 0.06)
+
+
+class LandscapePosterMapGenerator(_PosterMapGenerator):
+    FORMAT_ID = POSTER_70X50
     LABEL_FONT_PT = 26.0
     TITLE_FONT_PT = 96.0
     FOOTER_FONT_PT = 32.0
-
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        kwargs = dict(kwargs)
-        spec = self.PAPER_FORMATS.get(self.FORMAT_ID, {})
-        width_mm = float(spec.get("width_mm", 700.0))
-        height_mm = float(spec.get("height_mm", 500.0))
-        width_in = width_mm / self.MM_PER_INCH
-        height_in = height_mm / self.MM_PER_INCH
-        kwargs.setdefault("figsize", (width_in, height_in))
-        kwargs.setdefault("paper_format", self.FORMAT_ID)
-        kwargs.setdefault("min_margin_deg", 0.03)
-        kwargs.setdefault("max_margin_factor", 0.055)
-        kwargs.setdefault("curve_strength", 0.30)
-        kwargs.setdefault("lock_paper_orientation", True)
-        super().__init__(*args, **kwargs)
-        self.poster_margin_vertical = 0.05
-        self.poster_margin_horizontal = 0.06
-
-    def _label_font_size_pt(self) -> float:
-        return self.LABEL_FONT_PT
-
-    @classmethod
-    def paper_metadata(cls, dpi: int) -> Dict[str, Any]:
-        spec = MapGenerator.PAPER_FORMATS.get(cls.FORMAT_ID, {})
-        width_mm = float(spec.get("width_mm", 700.0))
-        height_mm = float(spec.get("height_mm", 500.0))
-        return {
-            "format": cls.FORMAT_ID,
-            "label": spec.get("label", "Plakat 70 × 50 cm"),
-            "orientation": "landscape",
-            "dpi": int(dpi),
-            "width_mm": width_mm,
-            "height_mm": height_mm,
-        }
-
-    def _margin_factor_lat(self, lat_span: float) -> float:
-        return self.poster_margin_vertical
-
-    def _margin_factor_lon(self, lon_span: float) -> float:
-        return self.poster_margin_horizontal
-
-    def _axes_box(self) -> Tuple[float, float, float, float]:
-        return (0.10, 0.20, 0.80, 0.60)
-
-    def _render_text_overlays(self, ax: plt.Axes) -> None:
-        fig = ax.figure
-        font_family = self.text_font_family or self.font_family
-        font_color = self.font_color
-
-        if self.title_text:
-            fig.text(
-                0.5,
-                0.93,
-                self.title_text,
-                ha='center',
-                va='top',
-                fontsize=self.TITLE_FONT_PT,
-                fontfamily=font_family,
-                color=font_color,
-                fontweight='normal',
-            )
-
-        footer_font_size = self.footer_font_size if self.footer_font_size is not None else self.FOOTER_FONT_PT
-
-        if self.footer_left_text:
-            self._render_footer_text_fig(
-                fig,
-                self.footer_left_text,
-                0.10,
-                0.08,
-                self._detect_footer_layout(self.footer_left_text),
-                'left',
-                font_family,
-                font_color,
-                footer_font_size,
-            )
-
-        if self.footer_right_text:
-            self._render_footer_text_fig(
-                fig,
-                self.footer_right_text,
-                0.90,
-                0.08,
-                self._detect_footer_layout(self.footer_right_text),
-                'right',
-                font_family,
-                font_color,
-                footer_font_size,
-            )
-
-    def generate_map(
-        self,
-        route: List[Dict],
-        output_file: Optional[str] = None,
-        label_overrides: Optional[Dict[str, Dict[str, float]]] = None,
-        render_labels: bool = True,
-        hidden_labels: Optional[set] = None,
-    ) -> Dict[str, Any]:
-        map_info = super().generate_map(
-            route,
-            output_file=output_file,
-            label_overrides=label_overrides,
-            render_labels=render_labels,
-            hidden_labels=hidden_labels,
-        )
-        style = map_info.setdefault("style", {})
-        style["title_font_size_pt"] = self.TITLE_FONT_PT
-        style["footer_font_size_pt"] = self.FOOTER_FONT_PT
-        return map_info
-
-
-class LargePosterMapGenerator(MapGenerator):
-    FORMAT_ID = "POSTER_60X100"
+    DEFAULT_SIZE_MM = (700.0, 500.0)
+    DEFAULT_LABEL = "Plakat 70 × 50 cm"
+    ORIENTATION = "landscape"
+    DEFAULT_KWARGS = {"max_margin_factor": 0.055, "curve_strength": 0.30}
+    POSTER_MARGINS = (0.05, 0.06)
+    AXES_BOX = (0.10, 0.20, 0.80, 0.60)
+    TITLE_XY = (0.5, 0.93)
+    FOOTER_LEFT_XY = (0.10, 0.08)
+    FOOTER_RIGHT_XY = (0.90, 0.08)
+
+
+class LargePosterMapGenerator(_PosterMapGenerator):
+    FORMAT_ID = POSTER_60X100
     LABEL_FONT_PT = 32.0
     TITLE_FONT_PT = 140.0
     FOOTER_FONT_PT = 44.0
-
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        kwargs = dict(kwargs)
-        spec = self.PAPER_FORMATS.get(self.FORMAT_ID, {})
-        width_mm = float(spec.get("width_mm", 600.0))
-        height_mm = float(spec.get("height_mm", 1000.0))
-        width_in = width_mm / self.MM_PER_INCH
-        height_in = height_mm / self.MM_PER_INCH
-        kwargs.setdefault("figsize", (width_in, height_in))
-        kwargs.setdefault("paper_format", self.FORMAT_ID)
-        kwargs.setdefault("min_margin_deg", 0.03)
-        kwargs.setdefault("max_margin_factor", 0.06)
-        kwargs.setdefault("curve_strength", 0.32)
-        kwargs.setdefault("lock_paper_orientation", True)
-        super().__init__(*args, **kwargs)
-        self.poster_margin_vertical = 0.05
-        self.poster_margin_horizontal = 0.08
-
-    def _label_font_size_pt(self) -> float:
-        return self.LABEL_FONT_PT
-
-    @classmethod
-    def paper_metadata(cls, dpi: int) -> Dict[str, Any]:
-        spec = MapGenerator.PAPER_FORMATS.get(cls.FORMAT_ID, {})
-        width_mm = float(spec.get("width_mm", 600.0))
-        height_mm = float(spec.get("height_mm", 1000.0))
-        return {
-            "format": cls.FORMAT_ID,
-            "label": spec.get("label", "Plakat 60 × 100 cm"),
-            "orientation": "portrait",
-            "dpi": int(dpi),
-            "width_mm": width_mm,
-            "height_mm": height_mm,
-        }
-
-    def _margin_factor_lat(self, lat_span: float) -> float:
-        return self.poster_margin_vertical
-
-    def _margin_factor_lon(self, lon_span: float) -> float:
-        return self.poster_margin_horizontal
-
-    def _axes_box(self) -> Tuple[float, float, float, float]:
-        return (0.08, 0.17, 0.84, 0.66)
-
-    def _render_text_overlays(self, ax: plt.Axes) -> None:
-        fig = ax.figure
-        font_family = self.text_font_family or self.font_family
-        font_color = self.font_color
-
-        if self.title_text:
-            fig.text(
-                0.5,
-                0.965,
-                self.title_text,
-                ha='center',
-                va='top',
-                fontsize=self.TITLE_FONT_PT,
-                fontfamily=font_family,
-                color=font_color,
-                fontweight='normal',
-            )
-
-        footer_font_size = self.footer_font_size if self.footer_font_size is not None else self.FOOTER_FONT_PT
-
-        if self.footer_left_text:
-            self._render_footer_text_fig(
-                fig,
-                self.footer_left_text,
-                0.08,
-                0.06,
-                self._detect_footer_layout(self.footer_left_text),
-                'left',
-                font_family,
-                font_color,
-                footer_font_size,
-            )
-
-        if self.footer_right_text:
-            self._render_footer_text_fig(
-                fig,
-                self.footer_right_text,
-                0.92,
-                0.06,
-                self._detect_footer_layout(self.footer_right_text),
-                'right',
-                font_family,
-                font_color,
-                footer_font_size,
-            )
-
-    def generate_map(
-        self,
-        route: List[Dict],
-        output_file: Optional[str] = None,
-        label_overrides: Optional[Dict[str, Dict[str, float]]] = None,
-        render_labels: bool = True,
-        hidden_labels: Optional[set] = None,
-    ) -> Dict[str, Any]:
-        map_info = super().generate_map(
-            route,
-            output_file=output_file,
-            label_overrides=label_overrides,
-            render_labels=render_labels,
-            hidden_labels=hidden_labels,
-        )
-        style = map_info.setdefault("style", {})
-        style["title_font_size_pt"] = self.TITLE_FONT_PT
-        style["footer_font_size_pt"] = self.FOOTER_FONT_PT
-        return map_info
-
-
-class LandscapeLargePosterMapGenerator(MapGenerator):
-    FORMAT_ID = "POSTER_100X60"
+    DEFAULT_SIZE_MM = (600.0, 1000.0)
+    DEFAULT_LABEL = "Plakat 60 × 100 cm"
+    ORIENTATION = "portrait"
+    DEFAULT_KWARGS = {"max_margin_factor": 0.06, "curve_strength": 0.32}
+    POSTER_MARGINS = (0.05, 0.08)
+    AXES_BOX = (0.08, 0.17, 0.84, 0.66)
+    TITLE_XY = (0.5, 0.965)
+    FOOTER_LEFT_XY = (0.08, 0.06)
+    FOOTER_RIGHT_XY = (0.92, 0.06)
+
+
+class LandscapeLargePosterMapGenerator(_PosterMapGenerator):
+    FORMAT_ID = POSTER_100X60
     LABEL_FONT_PT = 30.0
     TITLE_FONT_PT = 120.0
     FOOTER_FONT_PT = 40.0
-
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        kwargs = dict(kwargs)
-        spec = self.PAPER_FORMATS.get(self.FORMAT_ID, {})
-        width_mm = float(spec.get("width_mm", 1000.0))
-        height_mm = float(spec.get("height_mm", 600.0))
-        width_in = width_mm / self.MM_PER_INCH
-        height_in = height_mm / self.MM_PER_INCH
-        kwargs.setdefault("figsize", (width_in, height_in))
-        kwargs.setdefault("paper_format", self.FORMAT_ID)
-        kwargs.setdefault("min_margin_deg", 0.03)
-        kwargs.setdefault("max_margin_factor", 0.055)
-        kwargs.setdefault("curve_strength", 0.30)
-        kwargs.setdefault("lock_paper_orientation", True)
-        super().__init__(*args, **kwargs)
-        self.poster_margin_vertical = 0.05
-        self.poster_margin_horizontal = 0.06
-
-    def _label_font_size_pt(self) -> float:
-        return self.LABEL_FONT_PT
-
-    @classmethod
-    def paper_metadata(cls, dpi: int) -> Dict[str, Any]:
-        spec = MapGenerator.PAPER_FORMATS.get(cls.FORMAT_ID, {})
-        width_mm = float(spec.get("width_mm", 1000.0))
-        height_mm = float(spec.get("height_mm", 600.0))
-        return {
-            "format": cls.FORMAT_ID,
-            "label": spec.get("label", "Plakat 100 × 60 cm"),
-            "orientation": "landscape",
-            "dpi": int(dpi),
-            "width_mm": width_mm,
-            "height_mm": height_mm,
-        }
-
-    def _margin_factor_lat(self, lat_span: float) -> float:
-        return self.poster_margin_vertical
-
-    def _margin_factor_lon(self, lon_span: float) -> float:
-        return self.poster_margin_horizontal
-
-    def _axes_box(self) -> Tuple[float, float, float, float]:
-        return (0.10, 0.20, 0.80, 0.60)
-
-    def _render_text_overlays(self, ax: plt.Axes) -> None:
-        fig = ax.figure
-        font_family = self.text_font_family or self.font_family
-        font_color = self.font_color
-
-        if self.title_text:
-            fig.text(
-                0.5,
-                0.93,
-                self.title_text,
-                ha='center',
-                va='top',
-                fontsize=self.TITLE_FONT_PT,
-                fontfamily=font_family,
-                color=font_color,
-                fontweight='normal',
-            )
-
-        footer_font_size = self.footer_font_size if self.footer_font_size is not None else self.FOOTER_FONT_PT
-
-        if self.footer_left_text:
-            self._render_footer_text_fig(
-                fig,
-                self.footer_left_text,
-                0.10,
-                0.08,
-                self._detect_footer_layout(self.footer_left_text),
-                'left',
-                font_family,
-                font_color,
-                footer_font_size,
-            )
-
-        if self.footer_right_text:
-            self._render_footer_text_fig(
-                fig,
-                self.footer_right_text,
-                0.90,
-                0.08,
-                self._detect_footer_layout(self.footer_right_text),
-                'right',
-                font_family,
-                font_color,
-                footer_font_size,
-            )
-
-    def generate_map(
-        self,
-        route: List[Dict],
-        output_file: Optional[str] = None,
-        label_overrides: Optional[Dict[str, Dict[str, float]]] = None,
-        render_labels: bool = True,
-        hidden_labels: Optional[set] = None,
-    ) -> Dict[str, Any]:
-        map_info = super().generate_map(
-            route,
-            output_file=output_file,
-            label_overrides=label_overrides,
-            render_labels=render_labels,
-            hidden_labels=hidden_labels,
-        )
-        style = map_info.setdefault("style", {})
-        style["title_font_size_pt"] = self.TITLE_FONT_PT
-        style["footer_font_size_pt"] = self.FOOTER_FONT_PT
-        return map_info
+    DEFAULT_SIZE_MM = (1000.0, 600.0)
+    DEFAULT_LABEL = "Plakat 100 × 60 cm"
+    ORIENTATION = "landscape"
+    DEFAULT_KWARGS = {"max_margin_factor": 0.055, "curve_strength": 0.30}
+    POSTER_MARGINS = (0.05, 0.06)
+    AXES_BOX = (0.10, 0.20, 0.80, 0.60)
+    TITLE_XY = (0.5, 0.93)
+    FOOTER_LEFT_XY = (0.10, 0.08)
+    FOOTER_RIGHT_XY = (0.90, 0.08)
@@ -0,0 +1,45 @@
+"""
+Formaty papieru - wspólne dla generatora map i aplikacji webowej.
+
+Moduł nie importuje matplotlib, więc strona główna może zbudować listę formatów
+bez kosztu zimnego startu generatora.
+"""
+from typing import Dict, NamedTuple, Tuple
+
+
+class PaperSpec(NamedTuple):
+    """Wymiary (mm) i etykieta formatu papieru."""
+
+    width_mm: float
+    height_mm: float
+    label: str
+
+
+# Identyfikatory formatów plakatów (FORMAT_ID klas plakatów w map_generator)
+POSTER_50X70 = "POSTER_50X70"
+POSTER_70X50 = "POSTER_70X50"
+POSTER_60X100 = "POSTER_60X100"
+POSTER_100X60 = "POSTER_100X60"
+POSTCARD = "POSTCARD"
+
+PAPER_FORMATS: Dict[str, PaperSpec] = {
+    "A4": PaperSpec(210.0, 297.0, "A4 (210 × 297 mm)"),
+    "A3": PaperSpec(297.0, 420.0, "A3 (297 × 420 mm)"),
+    POSTER_50X70: PaperSpec(500.0, 700.0, "Plakat 50 × 70 cm"),
+    POSTER_70X50: PaperSpec(700.0, 500.0, "Plakat 70 × 50 cm"),
+    POSTER_60X100: PaperSpec(600.0, 1000.0, "Plakat 60 × 100 cm"),
+    POSTER_100X60: PaperSpec(1000.0, 600.0, "Plakat 100 × 60 cm"),
+    "SQUARE": PaperSpec(500.0, 500.0, "Kwadrat 1 : 1 (50 × 50 cm)"),
+    "RECTANGLE_3X2": PaperSpec(600.0, 400.0, "Prostokąt 3 : 2 (60 × 40 cm)"),
+    POSTCARD: PaperSpec(100.0, 150.0, "Pocztówka 10 × 15 cm (4 × 6 cali)"),
+}
+
+# Formaty do wyboru w formularzu strony: (id, etykieta); pusty id = format automatyczny
+WEB_PAPER_FORMATS: Tuple[Tuple[str, str], ...] = (
+    ("", "Automatycznie"),
+    (POSTCARD, PAPER_FORMATS[POSTCARD].label),
+    (POSTER_50X70, f"{PAPER_FORMATS[POSTER_50X70].label} (pionowy)"),
+    (POSTER_70X50, f"{PAPER_FORMATS[POSTER_70X50].label} (poziomy)"),
+    (POSTER_60X100, f"{PAPER_FORMATS[POSTER_60X100].label} (pionowy)"),
+    (POSTER_100X60, f"{PAPER_FORMATS[POSTER_100X60].label} (poziomy)"),
+)
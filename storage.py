@@ -1,64 +1,287 @@
 """
 Moduł przechowywania trasy - zarządza listą miast.
 """
+import hashlib
 import json
+import math
+import mmap
 import os
-from typing import List, Dict
+from array import array
+from typing import TYPE_CHECKING, Any, ClassVar, List, Dict, Optional, Tuple
+
+# NumPy tylko dla get_coords_array - import przy starcie CLI wydłużałby każdą komendę
+if TYPE_CHECKING:
+    import numpy as np
+
+try:
+    import orjson  # type: ignore
+    _ORJSON_AVAILABLE = True
+except Exception:
+    _ORJSON_AVAILABLE = False
 
 
 class StorageManager:
-    """Zarządza przechowywaniem trasy w pliku JSON."""
+    """
+    Zarządza przechowywaniem trasy w pliku JSON.
+
+    Trasa trzymana jest jako równoległe tablice: nazwy oraz szerokości i długości w array('d')
+    (brak lub niepoprawne współrzędne = NaN). Pozostałe pola miasta z pliku (i niepoprawne
+    wartości współrzędnych) trzymane są w równoległej liście `_extras`, więc zapis ich nie gubi.
+    Słowniki miast powstają dopiero dla get_route i zapisu pliku.
+
+    Domyślnie każda zmiana jest od razu zapisywana. Z autosave=False albo wewnątrz bloku
+    `with storage:` zmiany tylko oznaczają trasę jako zmienioną, a plik zapisuje flush()
+    (wywoływany też na wyjściu z bloku) - seria zmian to jeden zapis.
+    """
+
+    # Ostatnio wczytana/zapisana trasa wg ścieżki: (rozmiar, mtime), skrót treści, nazwy, szerokości,
+    # długości, dodatkowe pola. Kolejne instancje na tym samym niezmienionym pliku (np. jedna na żądanie)
+    # nie parsują go ponownie
+    _FILE_CACHE: ClassVar[Dict[
+        str,
+        Tuple[Tuple[int, int], bytes, Tuple[str, ...], array, array, Tuple[Optional[Dict[str, Any]], ...]],
+    ]] = {}
     
-    def __init__(self, storage_file: str = "route.json"):
+    def __init__(self, storage_file: str = "route.json", autosave: bool = True):
         self.storage_file = storage_file
-        self.route: List[Dict] = []
+        self.autosave = autosave
+        self._names: List[str] = []
+        self._lats = array('d')
+        self._lons = array('d')
+        self._extras: List[Optional[Dict[str, Any]]] = []
+        self._dirty = False
+        self._batch_depth = 0
+        # Skrót ostatnio zapisanej (lub wczytanej) zawartości pliku - niezmieniona trasa nie jest zapisywana
+        self._last_hash: Optional[bytes] = None
+        # (rozmiar, mtime) pliku po ostatnim zapisie/odczycie - zmiana z zewnątrz wymusza zapis
+        self._last_stat: Optional[Tuple[int, int]] = None
+        # Niezmienny widok trasy dla get_route, budowany ponownie dopiero po zmianie
+        self._route_snapshot: Optional[Tuple[Dict, ...]] = None
+        self._names_cache: Optional[Tuple[str, ...]] = None
         self.load_route()
+
+    def __enter__(self) -> "StorageManager":
+        self._batch_depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            self.flush()
     
+    @staticmethod
+    def _digest(data: bytes) -> bytes:
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def _file_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.storage_file)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
     def load_route(self) -> None:
         """Wczytuje trasę z pliku, jeśli istnieje."""
-        if os.path.exists(self.storage_file):
+        self._last_hash = None
+        self._last_stat = None
+        self._route_snapshot = None
+        self._names_cache = None
+        file_stat = self._file_stat()
+        cached = StorageManager._FILE_CACHE.get(os.path.abspath(self.storage_file))
+        if file_stat is not None and cached is not None and cached[0] == file_stat:
+            _, self._last_hash, names, lats, lons, extras = cached
+            self._names = list(names)
+            self._lats = array('d', lats)
+            self._lons = array('d', lons)
+            self._extras = [dict(extra) if extra else None for extra in extras]
+            self._last_stat = file_stat
+            return
+        if file_stat is not None:
             try:
-                with open(self.storage_file, 'r', encoding='utf-8') as f:
-                    self.route = json.load(f)
-            except (json.JSONDecodeError, IOError):
-                self.route = []
+                with open(self.storage_file, 'rb') as f:
+                    stat = os.fstat(f.fileno())
+                    if _ORJSON_AVAILABLE:
+                        # orjson parsuje zmapowane strony pliku bezpośrednio - bez kopii bajtów i dekodowania do str
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                            with memoryview(mm) as raw:
+                                route = orjson.loads(raw)
+                                digest = self._digest(raw)
+                    else:
+                        raw = f.read()
+                        route = json.loads(raw.decode('utf-8'))
+                        digest = self._digest(raw)
+                self._set_route(route)
+                self._last_hash = digest
+                self._last_stat = (stat.st_size, stat.st_mtime_ns)
+                self._remember_file()
+            except (ValueError, TypeError, KeyError, IOError):
+                self._set_route([])
         else:
-            self.route = []
+            self._set_route([])
+
+    def _remember_file(self) -> None:
+        StorageManager._FILE_CACHE[os.path.abspath(self.storage_file)] = (
+            self._last_stat,
+            self._last_hash,
+            tuple(self._names),
+            array('d', self._lats),
+            array('d', self._lons),
+            tuple(dict(extra) if extra else None for extra in self._extras),
+        )
+
+    @staticmethod
+    def _coord(value: Optional[float]) -> float:
+        return math.nan if value is None else float(value)
+
+    @staticmethod
+    def _coord_or_none(value: float) -> Optional[float]:
+        return None if math.isnan(value) else value
+
+    def _set_route(self, route: List[Dict[str, Any]]) -> None:
+        self._names = []
+        self._lats = array('d')
+        self._lons = array('d')
+        self._extras = []
+        for city in route:
+            if not isinstance(city, dict):
+                continue
+            extra = {key: value for key, value in city.items() if key not in ("name", "latitude", "longitude")}
+            coords = []
+            for field in ("latitude", "longitude"):
+                value = city.get(field)
+                try:
+                    coords.append(self._coord(value))
+                except (TypeError, ValueError):
+                    # Niepoprawna wartość zostaje w pliku bez zmian, dopóki miasto nie dostanie współrzędnych
+                    coords.append(math.nan)
+                    extra[field] = value
+            self._names.append(city.get("name"))
+            self._lats.append(coords[0])
+            self._lons.append(coords[1])
+            self._extras.append(extra or None)
+
+    def _build_route(self) -> List[Dict[str, Any]]:
+        coord = self._coord_or_none
+        route = []
+        for name, lat, lon, extra in zip(self._names, self._lats, self._lons, self._extras):
+            city = {"name": name, "latitude": coord(lat), "longitude": coord(lon)}
+            if extra:
+                city.update(extra)
+            route.append(city)
+        return route
+
+    @property
+    def route(self) -> List[Dict[str, Any]]:
+        """Trasa jako nowa lista słowników miast."""
+        return self._build_route()
+    
+    def _serialize(self, pretty: bool = False) -> bytes:
+        route = self._build_route()
+        if _ORJSON_AVAILABLE:
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+            return orjson.dumps(route, option=option)
+        if pretty:
+            return json.dumps(route, ensure_ascii=False, indent=2).encode('utf-8')
+        return json.dumps(route, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def export_pretty(self, output_file: str) -> None:
+        """Zapisuje trasę jako sformatowany JSON (wcięcia) do przeglądania przez człowieka."""
+        with open(output_file, 'wb') as f:
+            f.write(self._serialize(pretty=True))
     
     def save_route(self) -> None:
         """Zapisuje trasę do pliku."""
-        with open(self.storage_file, 'w', encoding='utf-8') as f:
-            json.dump(self.route, f, ensure_ascii=False, indent=2)
+        # Całość serializowana w pamięci i zapisana jednym write zamiast wielu małych zapisów json.dump.
+        # Plik roboczy jest zwięzły (bez wcięć) - wersję do czytania daje export_pretty
+        data = self._serialize()
+        digest = self._digest(data)
+        if digest == self._last_hash and self._file_stat() == self._last_stat:
+            self._dirty = False
+            return
+        # Zapis do pliku tymczasowego i podmiana - przerwany zapis nie zostawi uciętej trasy
+        tmp_file = f"{self.storage_file}.tmp"
+        # Gotowe bajty idą prosto do deskryptora - bez warstw buforujących obiektu pliku
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+        os.replace(tmp_file, self.storage_file)
+        self._last_hash = digest
+        self._last_stat = self._file_stat()
+        if self._last_stat is not None:
+            self._remember_file()
+        self._dirty = False
+
+    def flush(self) -> None:
+        """Zapisuje trasę, jeśli zmieniła się od ostatniego zapisu."""
+        if self._dirty:
+            self.save_route()
+
+    def _mark_dirty(self) -> None:
+        self._dirty = True
+        self._route_snapshot = None
+        self._names_cache = None
+        if self.autosave and self._batch_depth == 0:
+            self.save_route()
     
     def add_city(self, city_name: str, latitude: float = None, longitude: float = None) -> None:
         """Dodaje miasto do trasy."""
-        city_data = {
-            "name": city_name,
-            "latitude": latitude,
-            "longitude": longitude
-        }
-        self.route.append(city_data)
-        self.save_route()
+        self._names.append(city_name)
+        self._lats.append(self._coord(latitude))
+        self._lons.append(self._coord(longitude))
+        self._extras.append(None)
+        self._mark_dirty()
+    
+    def add_cities(self, cities: List[Tuple[str, Optional[float], Optional[float]]]) -> None:
+        """Dodaje wiele miast (nazwa, szerokość, długość) jako jedną zmianę - jeden zapis pliku."""
+        for city_name, latitude, longitude in cities:
+            self._names.append(city_name)
+            self._lats.append(self._coord(latitude))
+            self._lons.append(self._coord(longitude))
+            self._extras.append(None)
+        self._mark_dirty()
     
     def update_city_coordinates(self, index: int, latitude: float, longitude: float) -> None:
         """Aktualizuje współrzędne miasta o podanym indeksie."""
-        if 0 <= index < len(self.route):
-            self.route[index]["latitude"] = latitude
-            self.route[index]["longitude"] = longitude
-            self.save_route()
+        if 0 <= index < len(self._names):
+            self._lats[index] = self._coord(latitude)
+            self._lons[index] = self._coord(longitude)
+            extra = self._extras[index]
+            if extra:
+                extra.pop("latitude", None)
+                extra.pop("longitude", None)
+                self._extras[index] = extra or None
+            self._mark_dirty()
     
-    def get_route(self) -> List[Dict]:
-        """Zwraca aktualną trasę."""
-        return self.route.copy()
+    def get_route(self) -> Tuple[Dict, ...]:
+        """Zwraca aktualną trasę jako krotkę (ta sama do następnej zmiany trasy)."""
+        if self._route_snapshot is None:
+            self._route_snapshot = tuple(self._build_route())
+        return self._route_snapshot
+
+    def get_route_mutable_copy(self) -> List[Dict]:
+        """Zwraca kopię listy miast trasy, którą wywołujący może modyfikować."""
+        return self._build_route()
+
+    def get_coords_array(self) -> "np.ndarray":
+        """Zwraca współrzędne trasy jako tablicę (2, n): wiersz szerokości i wiersz długości (NaN = brak)."""
+        import numpy as np
+
+        return np.array([self._lats, self._lons], dtype=np.float64).reshape(2, len(self._names))
     
     def clear_route(self) -> None:
         """Czyści trasę."""
-        self.route = []
-        self.save_route()
+        self._set_route([])
+        self._mark_dirty()
     
-    def get_cities_list(self) -> List[str]:
-        """Zwraca listę nazw miast."""
-        return [city["name"] for city in self.route]
+    def get_cities_list(self) -> Tuple[str, ...]:
+        """Zwraca nazwy miast trasy (krotka zapamiętana do następnej zmiany trasy)."""
+        if self._names_cache is None:
+            self._names_cache = tuple(self._names)
+        return self._names_cache
 
 
 